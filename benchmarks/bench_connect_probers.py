@@ -0,0 +1,58 @@
+"""TCP-connect stage throughput per connect engine.
+
+Runs every ``CONNECTION_PROBERS`` engine against the same farm of local
+listeners: ``stream`` (asyncio.open_connection), ``socket`` (raw non-blocking
+``sock_connect``) and ``batch`` (one selector per batch in a worker thread).
+Run from the repository root: ``python -m benchmarks.bench_connect_probers``.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.farm import listener_farm, percentile, raise_nofile_limit
+from src.config import settings
+from src.prober import CONNECTION_PROBERS
+
+
+async def run_engines(
+    listeners: int,
+    rounds: int,
+    concurrency: int,
+) -> dict[str, tuple[float, list[float]]]:
+    results = {}
+    async with listener_farm(listeners) as servers:
+        for name, prober_class in CONNECTION_PROBERS.items():
+            prober = prober_class(max_concurrent=concurrency)
+            prober._limiter.adaptive = False  # noqa: SLF001
+            samples = []
+            start = time.perf_counter()
+            for _ in range(rounds):
+                await prober.probe(servers)
+                samples.extend(server.response_time.connection for server in servers)
+            results[name] = (time.perf_counter() - start, samples)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listeners", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+    results = asyncio.run(run_engines(args.listeners, args.rounds, args.concurrency))
+    for name, (elapsed, samples) in results.items():
+        failed = sum(
+            sample >= settings.DONT_ALIVE_CONNECTION_TIME for sample in samples
+        )
+        print(
+            f"{name:<8} {len(samples) / elapsed:>9,.0f} probes/s  "
+            f"connect p50={percentile(samples, 0.5) * 1000:.2f}ms "
+            f"p99={percentile(samples, 0.99) * 1000:.2f}ms  failed={failed}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""xray control-plane rates against ``FakeXray``.
+
+Measures ``XrayPoolHandler.add_inbound_pool`` and the setup (outbounds added)
+and teardown (outbounds removed) halves of ``outbound_pool`` over chunks of
+generated servers, with injected per-call latency and failures. Teardown
+includes the fixed settle delay of ``outbound_pool``.
+Run from the repository root with both the root and ``src`` importable:
+``PYTHONPATH=.:src python -m benchmarks.bench_control_plane``.
+"""
+
+import argparse
+import logging
+import time
+
+import grpc
+
+from benchmarks.corpus import generate_links
+from benchmarks.fake_xray import FakeXray
+from src.server.parser import parse_url
+from src.xray.handlers import XrayPoolHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=50)
+    parser.add_argument("--call-latency", type=float, default=0.001)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--failing-methods",
+        default="AddOutbound,RemoveOutbound",
+        help="comma-separated RPC names that get injected failures",
+    )
+    args = parser.parse_args()
+    # Injected AddOutbound failures are logged as warnings by outbound_pool
+    logging.disable(logging.WARNING)
+
+    servers = [
+        parse_url(link) for link in generate_links(args.servers, vmess_ratio=0.3)
+    ]
+    chunks = [
+        servers[i : i + args.pool_size] for i in range(0, len(servers), args.pool_size)
+    ]
+    xray = FakeXray(
+        call_latency=args.call_latency,
+        failure_rate=args.failure_rate,
+        failing_methods=frozenset(args.failing_methods.split(",")),
+    )
+    pool_manager = XrayPoolHandler(api_url=xray.start(), pool_size=args.pool_size)
+    pool_manager.process_manager = xray.process
+
+    start = time.perf_counter()
+    pool_manager.process_manager.run()
+    pool_manager.add_inbound_pool()
+    inbound_time = time.perf_counter() - start
+
+    setup_time = teardown_time = 0.0
+    teardown_errors = 0
+    for chunk in chunks:
+        pool = pool_manager.outbound_pool(chunk)
+        start = time.perf_counter()
+        pool.__enter__()
+        setup_time += time.perf_counter() - start
+        start = time.perf_counter()
+        try:
+            pool.__exit__(None, None, None)
+        except grpc.RpcError:
+            teardown_errors += 1
+        teardown_time += time.perf_counter() - start
+    xray.shutdown()
+
+    print(
+        f"call latency {args.call_latency * 1000:.1f}ms, "
+        f"failure rate {args.failure_rate:.0%}, {len(chunks)} chunks",
+    )
+    print(f"inbound pool  {args.pool_size / inbound_time:>9,.0f} inbounds/s")
+    print(f"setup         {len(servers) / setup_time:>9,.0f} outbounds/s")
+    print(
+        f"teardown      {len(servers) / teardown_time:>9,.0f} outbounds/s "
+        f"({teardown_errors} chunks aborted by a failed remove)",
+    )
+    print(
+        "calls: "
+        + ", ".join(f"{method}={count}" for method, count in xray.calls.items())
+        + f"  failures: {sum(xray.failures.values())}",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare reload time of the legacy JSON dump and the binary dumps.
+
+Run from the repository root: ``python -m benchmarks.bench_dump``.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate_links
+from src.config import settings
+from src.server.parser import parse_url
+from src.server.server import ServerDumper
+
+
+def _time_read(dumper: ServerDumper, dump_path: Path) -> tuple[float, int]:
+    servers = set()
+    start = time.perf_counter()
+    dumper.read_servers_dump(dump_path, servers)
+    return time.perf_counter() - start, len(servers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", type=int, default=200_000)
+    parser.add_argument("--top", type=int, default=100)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)  # noqa: S311
+    servers = {
+        parse_url(link, f"https://sub{rnd.randint(1, 800)}.example.com/sub")
+        for link in generate_links(args.servers, vmess_ratio=0.3)
+    }
+    for server in servers:
+        server.response_time.connection = round(rnd.uniform(0.01, 1), 3)
+        for url in settings.HTTP_REAL_SITES:
+            server.response_time.http[url] = rnd.uniform(0.1, 3)
+
+    dumper = ServerDumper()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        settings.DUMPS_DIR = Path(tmp_dir)
+        for name in ("dump.json", "dump.vtsd", "dump.vtsi"):
+            start = time.perf_counter()
+            dumper.write_servers_dump(servers, name)
+            write_time = time.perf_counter() - start
+            size = (settings.DUMPS_DIR / name).stat().st_size
+            read_time, loaded = _time_read(dumper, settings.DUMPS_DIR / name)
+            print(
+                f"{name:<10} write {write_time:6.3f}s  read {read_time:6.3f}s  "
+                f"{size / 2**20:7.1f} MiB  {loaded} servers",
+            )
+
+        indexed_path = settings.DUMPS_DIR / "dump.vtsi"
+        start = time.perf_counter()
+        top = dumper.read_top_servers(indexed_path, args.top)
+        print(f"indexed top {len(top)}: {time.perf_counter() - start:.4f}s")
+        start = time.perf_counter()
+        subscription = dumper.read_subscription_servers(
+            indexed_path,
+            top[0].from_subscription,
+        )
+        print(
+            f"indexed one subscription ({len(subscription)} servers): "
+            f"{time.perf_counter() - start:.4f}s",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""TCP-connect stage throughput and timing accuracy per event loop.
+
+Starts a farm of local listeners and runs ``ConnectionProber`` against them on
+every available loop implementation. Loopback connects take microseconds, so
+the measured connect time is almost entirely loop overhead: lower is more
+accurate. Run from the repository root: ``python -m benchmarks.bench_event_loop``.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.farm import listener_farm, percentile, raise_nofile_limit
+from src.config import settings
+from src.event_loop import EVENT_LOOPS, get_loop_factory
+from src.prober import ConnectionProber
+
+
+async def run_stage(
+    listeners: int,
+    rounds: int,
+    concurrency: int,
+    *,
+    adaptive: bool,
+) -> tuple[float, list[float]]:
+    async with listener_farm(listeners) as servers:
+        prober = ConnectionProber(max_concurrent=concurrency)
+        prober._limiter.adaptive = adaptive  # noqa: SLF001
+        samples = []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await prober.probe(servers)
+            samples.extend(server.response_time.connection for server in servers)
+        elapsed = time.perf_counter() - start
+    return elapsed, samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listeners", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--adaptive", action="store_true")
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+
+    for name in EVENT_LOOPS:
+        loop_factory = get_loop_factory(name)
+        if name != "asyncio" and loop_factory is None:
+            print(f"{name:<8} not installed, skipped")
+            continue
+        elapsed, samples = asyncio.run(
+            run_stage(
+                args.listeners,
+                args.rounds,
+                args.concurrency,
+                adaptive=args.adaptive,
+            ),
+            loop_factory=loop_factory,
+        )
+        failed = sum(
+            sample >= settings.DONT_ALIVE_CONNECTION_TIME for sample in samples
+        )
+        print(
+            f"{name:<8} {len(samples) / elapsed:>9,.0f} probes/s  "
+            f"connect p50={percentile(samples, 0.5) * 1000:.1f}ms "
+            f"p99={percentile(samples, 0.99) * 1000:.1f}ms  failed={failed}",
+        )
+
+
+if __name__ == "__main__":
+    main()
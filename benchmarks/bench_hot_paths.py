@@ -0,0 +1,178 @@
+"""Micro-benchmarks for the CPU hot paths, with JSON results and baselines.
+
+Cases, each run over a generated corpus of every ``--sizes`` value:
+
+- ``parse_vless`` / ``parse_vmess``: ``parse_url`` per link;
+- ``build_vless`` / ``build_vmess``: outbound protobuf config building
+  (``add_vless`` / ``add_vmess`` including ``to_typed_message``);
+- ``generate_subscription``: ``ServerExporter.generate_subscription``;
+- ``rank_http`` / ``rank_connection``: the ``ServerManager`` ranking sorts.
+
+``--output`` saves the results, ``--compare`` checks them against a saved
+baseline and exits with status 1 when a case got slower than ``--threshold``.
+Run from the repository root with both the root and ``src`` importable:
+``PYTHONPATH=.:src python -m benchmarks.bench_hot_paths --output base.json``.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+from benchmarks.corpus import generate_links
+from src.server.history import ServerHistory
+from src.server.parser import parse_url
+from src.server.schema import Server
+from src.server.server import ServerExporter, ServerManager
+from src.xray.protocols import OutboundProtocol
+
+RESULTS_VERSION = 1
+
+
+def _servers(links: list[str]) -> list[Server]:
+    rnd = random.Random(0)  # noqa: S311
+    servers = [parse_url(link) for link in links]
+    for server in servers:
+        server.response_time.connection = rnd.uniform(0.01, 2.0)
+        server.response_time.http.update(
+            {"a": rnd.uniform(0.05, 3.0), "b": rnd.uniform(0.05, 3.0)},
+        )
+    return servers
+
+
+def _build(servers: list[Server]) -> None:
+    for num, server in enumerate(servers):
+        OutboundProtocol[server.protocol].add(server, f"outbound{num}")
+
+
+def _manager(servers: list[Server]) -> ServerManager:
+    manager = ServerManager(history=ServerHistory())
+    manager.servers = set(servers)
+    return manager
+
+
+def make_cases(size: int) -> dict[str, tuple[Callable[[], object], int]]:
+    """Return ``{case: (func, items)}`` for a corpus of ``size`` links."""
+    vless_links = generate_links(size, seed=size)
+    vmess_links = generate_links(size, vmess_ratio=1.0, seed=size)
+    vless_servers = _servers(vless_links)
+    vmess_servers = _servers(vmess_links)
+    mixed = vless_servers[: size // 2] + vmess_servers[size // 2 :]
+    manager = _manager(mixed)
+    exporter = ServerExporter()
+    return {
+        "parse_vless": (lambda: [parse_url(link) for link in vless_links], size),
+        "parse_vmess": (lambda: [parse_url(link) for link in vmess_links], size),
+        "build_vless": (lambda: _build(vless_servers), size),
+        "build_vmess": (lambda: _build(vmess_servers), size),
+        "generate_subscription": (
+            lambda: exporter.generate_subscription(mixed),
+            size,
+        ),
+        "rank_http": (
+            lambda: list(manager.fastest_http_response_time_servers()),
+            len(manager.servers),
+        ),
+        "rank_connection": (
+            lambda: list(manager.fastest_connention_time_servers()),
+            len(manager.servers),
+        ),
+    }
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes: list[int], repeat: int, only: set[str]) -> dict:
+    results = {}
+    for size in sizes:
+        for case, (func, items) in make_cases(size).items():
+            if only and case not in only:
+                continue
+            seconds = best_of(func, repeat)
+            results[f"{case}[{size}]"] = {
+                "seconds": seconds,
+                "items": items,
+                "us_per_item": seconds / items * 1e6,
+            }
+            print(
+                f"{case + f'[{size}]':<32} {seconds:9.4f}s "
+                f"{seconds / items * 1e6:9.2f}us/item",
+            )
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    """Print the change per case, return False if any case regressed."""
+    ok = True
+    for name, result in current["results"].items():
+        if (base := baseline["results"].get(name)) is None:
+            print(f"{name:<32} (not in baseline)")
+            continue
+        change = result["us_per_item"] / base["us_per_item"] - 1
+        regressed = change > threshold
+        ok &= not regressed
+        print(
+            f"{name:<32} {base['us_per_item']:9.2f} -> "
+            f"{result['us_per_item']:9.2f}us/item {change:+7.1%}"
+            f"{'  REGRESSION' if regressed else ''}",
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        default="10000",
+        help="comma-separated corpus sizes, e.g. 10000,100000,1000000",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", default="", help="comma-separated case names")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="allowed slowdown per item before a case counts as a regression",
+    )
+    args = parser.parse_args()
+
+    results = run(
+        [int(size) for size in args.sizes.split(",")],
+        args.repeat,
+        set(filter(None, args.cases.split(","))),
+    )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print(f"\nvs {args.compare} ({baseline['created']}):")
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""HTTP-stage throughput per HTTP engine.
+
+Runs every ``HTTP_PROBERS`` engine over the same farm of loopback listeners,
+behind ``FakeXray`` (gRPC control plane plus a SOCKS relay): ``session`` (one
+``AsyncSession.get`` coroutine per request) and ``multi`` (every request of a
+chunk as an easy handle on one curl multi handle). Chunks are ``--pool-size``
+inbounds, so a chunk puts that many SOCKS ports behind the engine at once.
+The relay runs on its own event loop in the same process, so both engines pay
+the same relay cost.
+
+Run from the repository root with both the root and ``src`` importable:
+``PYTHONPATH=.:src python -m benchmarks.bench_http_engines``.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.fake_xray import FakeXray
+from benchmarks.farm import listener_farm, percentile, raise_nofile_limit
+from src.config import settings
+from src.prober import HTTP_PROBERS
+from src.xray.handlers import XrayPoolHandler
+
+PROBE_URL = "http://probe.bench/generate_204"
+
+
+async def run_engines(
+    args: argparse.Namespace,
+) -> dict[str, tuple[float, list[float]]]:
+    results = {}
+    xray = FakeXray(relay=True)
+    api_url = xray.start()
+    urls = tuple(f"{PROBE_URL}?n={num}" for num in range(args.urls))
+    async with listener_farm(args.listeners) as servers:
+        for name, prober_class in HTTP_PROBERS.items():
+            prober = prober_class(
+                concurent_connections=args.concurrency,
+                urls=urls,
+                url_policy="parallel",
+                pool_size=args.pool_size,
+            )
+            prober._limiter.adaptive = False  # noqa: SLF001
+            prober.pool_manager = XrayPoolHandler(
+                api_url=api_url,
+                pool_size=args.pool_size,
+            )
+            prober.pool_manager.process_manager = xray.process
+            samples = []
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                for server in servers:
+                    server.response_time.reset()
+                await prober.probe(servers, keep_alive=True)
+                samples.extend(
+                    latency
+                    for server in servers
+                    for latency in server.response_time.http.values()
+                )
+            results[name] = (time.perf_counter() - start, samples)
+            await prober.close()
+    xray.shutdown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listeners", type=int, default=2000)
+    parser.add_argument("--pool-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--urls", type=int, default=1)
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+    results = asyncio.run(run_engines(args))
+    for name, (elapsed, samples) in results.items():
+        failed = sum(
+            sample >= settings.DONT_ALIVE_CONNECTION_TIME for sample in samples
+        )
+        alive = [
+            sample
+            for sample in samples
+            if sample < settings.DONT_ALIVE_CONNECTION_TIME
+        ] or [0.0]
+        print(
+            f"{name:<8} {len(samples) / elapsed:>9,.0f} requests/s  "
+            f"p50={percentile(alive, 0.5) * 1000:.2f}ms "
+            f"p99={percentile(alive, 0.99) * 1000:.2f}ms  failed={failed}",
+        )
+
+
+if __name__ == "__main__":
+    main()
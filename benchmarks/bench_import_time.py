@@ -0,0 +1,73 @@
+"""Cold-start import cost of main.py and the library entry points.
+
+Every module is imported in a fresh interpreter with ``python -X importtime``.
+Run from the repository root: ``python -m benchmarks.bench_import_time``.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = (
+    "main",
+    "src.subscription",
+    "src.server.parser",
+    "src.server.server",
+    "src.prober",
+    "src.xray.handlers",
+)
+HEAVY_PACKAGES = ("grpc", "curl_cffi", "google.protobuf")
+
+
+def measure_import(module: str) -> tuple[int, list[str]]:
+    """Return the cumulative import time (us) and the list of imported modules."""
+    env = os.environ | {"PYTHONPATH": os.pathsep.join((str(ROOT), str(ROOT / "src")))}
+    with tempfile.TemporaryDirectory() as cwd:
+        # main.py configures a file log handler at import time
+        (Path(cwd) / "logs").mkdir()
+        result = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    total = 0
+    imported = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        imported.append(name.strip())
+        if not name.startswith("  "):
+            total += int(cumulative)
+    return total, imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<22}{'median ms':>10}{'modules':>9}{'pb2':>6}  heavy")
+    for module in args.modules:
+        samples = [measure_import(module) for _ in range(args.repeat)]
+        imported = samples[-1][1]
+        heavy = [pkg for pkg in HEAVY_PACKAGES if pkg in imported]
+        pb2_count = sum(name.endswith("_pb2") for name in imported)
+        median_ms = statistics.median(total for total, _ in samples) / 1000
+        print(
+            f"{module:<22}{median_ms:>10.1f}{len(imported):>9}{pb2_count:>6}"
+            f"  {', '.join(heavy) or '-'}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Measure link ingest with and without the raw-link pre-dedupe.
+
+Run from the repository root: ``python -m benchmarks.bench_ingest``.
+"""
+
+import argparse
+import time
+
+from benchmarks.corpus import add_duplicates, generate_links
+from src.server.exceptions import ServerError
+from src.server.parser import parse_url, server_key
+from src.server.schema import Server
+
+
+def _ingest_all(links: list[str]) -> set[Server]:
+    servers = set()
+    for link in links:
+        try:
+            servers.add(parse_url(link))
+        except ServerError:  # noqa: PERF203
+            continue
+    return servers
+
+
+def _ingest_deduped(links: list[str]) -> set[Server]:
+    servers = set()
+    keys = set()
+    for link in links:
+        if server_key(link) in keys:
+            continue
+        try:
+            server = parse_url(link)
+        except ServerError:
+            continue
+        servers.add(server)
+        keys.add((server.address, server.port))
+    return servers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--unique-links", type=int, default=30_000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.7)
+    parser.add_argument("--vmess-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    links = add_duplicates(
+        generate_links(args.unique_links, vmess_ratio=args.vmess_ratio),
+        args.duplicate_ratio,
+    )
+    start = time.perf_counter()
+    baseline = _ingest_all(links)
+    baseline_time = time.perf_counter() - start
+    start = time.perf_counter()
+    deduped = _ingest_deduped(links)
+    deduped_time = time.perf_counter() - start
+    assert baseline == deduped
+
+    print(f"links:      {len(links)} ({len(baseline)} unique servers)")
+    print(f"parse all:  {baseline_time:.3f}s")
+    print(f"pre-dedupe: {deduped_time:.3f}s")
+    print(f"saved:      {1 - deduped_time / baseline_time:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Connect-stage throughput under each logging setup.
+
+Probes a farm of local listeners with ``setup_logging(debug=True)`` so that
+every server logs a DEBUG record, in four modes:
+
+- ``off``: DEBUG disabled, the lower bound of logging cost;
+- ``sync``: the console handler formats and writes on the event loop;
+- ``queue``: records go through ``LazyQueueHandler`` to the listener thread;
+- ``sampled``: ``queue`` plus ``LOG_SAMPLE_RATES`` sampling.
+
+Console output goes to a temporary file, so the write cost is real but does
+not flood the terminal.
+Run from the repository root: ``python -m benchmarks.bench_logging``.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import tempfile
+import time
+
+from benchmarks.farm import listener_farm, raise_nofile_limit
+from src.config import settings
+from src.logger_config import setup_logging, stop_queue_listener
+from src.prober import ConnectionProber
+
+MODES = {
+    "off": {"use_queue": False, "sample_rates": {}},
+    "sync": {"use_queue": False, "sample_rates": {}},
+    "queue": {"use_queue": True, "sample_rates": {}},
+    "sampled": {"use_queue": True, "sample_rates": settings.LOG_SAMPLE_RATES},
+}
+
+
+async def probe_rounds(listeners: int, rounds: int, concurrency: int) -> float:
+    async with listener_farm(listeners) as servers:
+        prober = ConnectionProber(max_concurrent=concurrency)
+        prober._limiter.adaptive = False  # noqa: SLF001
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await prober.probe(servers)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listeners", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+    probes = args.listeners * args.rounds
+    for mode, options in MODES.items():
+        with (
+            tempfile.TemporaryFile("w+", encoding="utf-8") as console,
+            contextlib.redirect_stderr(console),
+        ):
+            setup_logging(debug=True, **options)
+            if mode == "off":
+                logging.getLogger().setLevel(logging.INFO)
+            elapsed = asyncio.run(
+                probe_rounds(args.listeners, args.rounds, args.concurrency),
+            )
+            stop_queue_listener()
+            console.seek(0)
+            lines = sum(1 for _ in console)
+        print(
+            f"{mode:<8} {probes / elapsed:>9,.0f} probes/s "
+            f"{lines:>8} lines logged",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""End-to-end pipeline benchmark on local stand-ins only.
+
+Serves generated base64 subscriptions (with duplicates) over local HTTP, points
+every link at a farm of loopback listeners with injected latency and drop
+rate, and replaces xray with ``FakeXray`` (gRPC control plane plus a SOCKS
+relay). Then runs fetch -> ingest -> connect -> HTTP exactly like ``main.py``
+and reports per-stage timings, end-to-end servers/second and the HTTP
+requests sent and skipped by the URL policy (``--urls`` probe URLs per server,
+``--dead-rate`` of the servers unreachable through the relay). With
+``--warm-requests`` it also reports how many warm requests reused the cold
+connection and the mean cold and warm latency.
+
+The TLS stage is skipped: farm listeners speak plain TCP.
+Run from the repository root with both the root and ``src`` importable:
+``PYTHONPATH=.:src python -m benchmarks.bench_pipeline``.
+"""
+
+import argparse
+import asyncio
+import base64
+import statistics
+import time
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from benchmarks.corpus import add_duplicates, generate_local_links
+from benchmarks.fake_xray import FakeXray
+from benchmarks.farm import listener_farm, raise_nofile_limit
+from src import metrics
+from src.config import settings
+from src.prober import HTTP_URL_POLICIES
+from src.server.history import ServerHistory
+from src.server.server import ServerManager
+from src.subscription import SubscriptionManager
+from src.xray.handlers import XrayPoolHandler
+
+PROBE_URL = "http://probe.bench/generate_204"
+
+
+async def serve_subscriptions(
+    bodies: list[bytes],
+) -> tuple[asyncio.Server, list[str]]:
+    async def handle(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        request = await reader.readuntil(b"\r\n\r\n")
+        index = int(request.split(b" ", 2)[1].rsplit(b"/", 1)[1])
+        body = bodies[index]
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (len(body), body),
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, [f"http://127.0.0.1:{port}/sub/{num}" for num in range(len(bodies))]
+
+
+async def timed(
+    timings: dict[str, float],
+    stage: str,
+    func: Callable[[], Coroutine[Any, Any, None]],
+) -> None:
+    start = time.perf_counter()
+    await func()
+    timings[stage] = time.perf_counter() - start
+
+
+async def run_pipeline(args: argparse.Namespace) -> tuple[dict[str, float], dict]:
+    timings: dict[str, float] = {}
+    counts: dict[str, int] = {}
+    xray = FakeXray(relay=True, dead_rate=args.dead_rate)
+    api_url = xray.start()
+    async with listener_farm(
+        args.listeners,
+        max_latency=args.max_latency,
+        drop_rate=args.drop_rate,
+    ) as farm_servers:
+        links = add_duplicates(
+            generate_local_links(
+                [server.port for server in farm_servers],
+                vmess_ratio=args.vmess_ratio,
+            ),
+            args.duplicate_ratio,
+        )
+        chunk = -(-len(links) // args.subscriptions)
+        bodies = [
+            base64.b64encode("\n".join(links[i : i + chunk]).encode())
+            for i in range(0, len(links), chunk)
+        ]
+        sub_server, urls = await serve_subscriptions(bodies)
+        counts["links"] = len(links)
+
+        subscriptions = SubscriptionManager()
+        for url in urls:
+            subscriptions.add_subscription(url)
+        # An empty history: probe order must not depend on earlier runs
+        server_manager = ServerManager(history=ServerHistory())
+        pool_manager = XrayPoolHandler(api_url=api_url)
+        pool_manager.process_manager = xray.process
+        server_manager.http_prober.pool_manager = pool_manager
+        server_manager.http_prober.urls = tuple(
+            f"{PROBE_URL}?n={num}" for num in range(args.urls)
+        )
+        server_manager.http_prober.url_policy = args.url_policy
+        server_manager.http_prober.cutoff_top_k = args.cutoff_top_k
+        server_manager.http_prober.warm_requests = args.warm_requests
+
+        start = time.perf_counter()
+        await timed(timings, "fetch", subscriptions.fetch_subscriptions_content)
+
+        async def ingest() -> None:
+            server_manager.add_from_subscriptions(subscriptions.subscriptions)
+
+        await timed(timings, "ingest", ingest)
+        counts["parsed"] = len(server_manager.servers)
+        await timed(
+            timings,
+            "connect",
+            server_manager.filter_alive_connection_servers,
+        )
+        counts["connected"] = len(server_manager.servers)
+        await timed(timings, "http", server_manager.filter_alive_http_servers)
+        counts["alive"] = len(server_manager.servers)
+        counts["cold"] = [
+            latency
+            for server in server_manager.servers
+            for latency in server.response_time.http.values()
+        ]
+        counts["warm"] = [
+            latency
+            for server in server_manager.servers
+            for latency in server.response_time.http_warm.values()
+        ]
+        timings["total"] = time.perf_counter() - start
+        sub_server.close()
+    xray.shutdown()
+    return timings, counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listeners", type=int, default=500)
+    parser.add_argument("--subscriptions", type=int, default=10)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.5)
+    parser.add_argument("--vmess-ratio", type=float, default=0.3)
+    parser.add_argument("--max-latency", type=float, default=0.2)
+    parser.add_argument("--drop-rate", type=float, default=0.2)
+    parser.add_argument("--dead-rate", type=float, default=0.0)
+    parser.add_argument("--urls", type=int, default=1)
+    parser.add_argument(
+        "--url-policy",
+        choices=HTTP_URL_POLICIES,
+        default=settings.HTTP_PROBER_URL_POLICY,
+    )
+    parser.add_argument("--cutoff-top-k", type=int, default=0)
+    parser.add_argument("--warm-requests", type=int, default=0)
+    args = parser.parse_args()
+
+    raise_nofile_limit()
+    timings, counts = asyncio.run(run_pipeline(args))
+    print(
+        f"links={counts['links']} parsed={counts['parsed']} "
+        f"connected={counts['connected']} alive={counts['alive']} "
+        f"(pool size {settings.XRAY_POOL_SIZE})",
+    )
+    for stage, elapsed in timings.items():
+        print(f"{stage:<8} {elapsed:8.3f}s")
+    print(f"end-to-end {counts['parsed'] / timings['total']:,.0f} servers/s")
+    sent = sum(
+        metrics.PROBES.labels("http", result).value for result in ("ok", "failed")
+    )
+    skipped = sum(
+        metrics.HTTP_REQUESTS_SKIPPED.labels(reason).value
+        for reason in ("failure", "cutoff")
+    )
+    print(
+        f"http requests sent={sent:.0f} skipped={skipped:.0f} "
+        f"({sent / max(counts['connected'], 1):.2f} per server, "
+        f"{args.url_policy})",
+    )
+    if args.warm_requests:
+        reused, new = (
+            metrics.HTTP_WARM_REQUESTS.labels(connection).value
+            for connection in ("reused", "new")
+        )
+        print(
+            f"warm requests reused={reused:.0f} new={new:.0f} | "
+            f"mean cold {statistics.fmean(counts['cold'] or [0]):.4f}s "
+            f"warm {statistics.fmean(counts['warm'] or [0]):.4f}s",
+        )
+
+
+if __name__ == "__main__":
+    main()
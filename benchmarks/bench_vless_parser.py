@@ -0,0 +1,59 @@
+"""Compare the single-pass vless parser with the urlparse based path.
+
+Run from the repository root: ``python -m benchmarks.bench_vless_parser``.
+"""
+
+import argparse
+import time
+from urllib.parse import urlparse
+
+from benchmarks.corpus import generate_links
+from src.server.protocols import vless
+
+
+def _generic(links: list[str]) -> list:
+    return [vless.parse_url(urlparse(link)) for link in links]
+
+
+def _fast(links: list[str]) -> list:
+    return [
+        vless.parse_raw_url(link) or vless.parse_url(urlparse(link))
+        for link in links
+    ]
+
+
+def _best_of(func, links: list[str], repeat: int) -> float:  # noqa: ANN001
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(links)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--links", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    links = generate_links(args.links)
+    for generic, fast in zip(_generic(links), _fast(links), strict=True):
+        assert (generic.address, generic.port, generic.username, generic.params) == (
+            fast.address,
+            fast.port,
+            fast.username,
+            fast.params,
+        ), generic.raw_url
+    fast_path_hits = sum(vless.parse_raw_url(link) is not None for link in links)
+
+    generic_time = _best_of(_generic, links, args.repeat)
+    fast_time = _best_of(_fast, links, args.repeat)
+    print(f"links:      {len(links)} ({fast_path_hits} on the fast path)")
+    print(f"urlparse:   {generic_time:.3f}s ({len(links) / generic_time:,.0f} links/s)")
+    print(f"fast path:  {fast_time:.3f}s ({len(links) / fast_time:,.0f} links/s)")
+    print(f"speed-up:   x{generic_time / fast_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
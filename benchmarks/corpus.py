@@ -0,0 +1,114 @@
+import base64
+import json
+import random
+import uuid
+
+VLESS_QUERIES = (
+    "security=reality&sni=www.microsoft.com&fp=chrome&pbk={pbk}&sid={sid}"
+    "&type=tcp&flow=xtls-rprx-vision",
+    "security=tls&sni={host}&type=ws&path=/ws&host={host}&alpn=h2,http/1.1",
+    "security=tls&sni={host}&type=grpc&serviceName=grpc&fp=firefox",
+    "type=tcp&security=none",
+    "encryption=none&security=tls&sni={host}&type=ws&path=%2Fws%3Fed%3D2048",
+)
+
+
+def random_host(rnd: random.Random) -> str:
+    if rnd.random() < 0.5:  # noqa: PLR2004
+        return ".".join(str(rnd.randint(1, 254)) for _ in range(4))
+    return f"node{rnd.randint(1, 10**6)}.example{rnd.randint(1, 50)}.com"
+
+
+def generate_vless_link(
+    rnd: random.Random,
+    host: str | None = None,
+    port: int | None = None,
+) -> str:
+    host = host or random_host(rnd)
+    port = port or rnd.choice((443, 443, 443, 8443, 2053, rnd.randint(1024, 65535)))
+    query = rnd.choice(VLESS_QUERIES).format(
+        host=host,
+        pbk=base64.urlsafe_b64encode(rnd.randbytes(32)).decode().rstrip("="),
+        sid=rnd.randbytes(4).hex(),
+    )
+    user_id = uuid.UUID(bytes=rnd.randbytes(16))
+    return f"vless://{user_id}@{host}:{port}?{query}#remark-{rnd.randint(1, 999)}"
+
+
+def generate_vmess_link(
+    rnd: random.Random,
+    host: str | None = None,
+    port: int | None = None,
+) -> str:
+    host = host or random_host(rnd)
+    params = {
+        "v": "2",
+        "ps": f"remark-{rnd.randint(1, 999)}",
+        "add": host,
+        "port": port or rnd.choice((443, 443, 8080, 2083)),
+        "id": str(uuid.UUID(bytes=rnd.randbytes(16))),
+        "aid": 0,
+        "net": rnd.choice(("ws", "tcp", "grpc")),
+        "type": "none",
+        "host": host,
+        "path": "/",
+        "tls": rnd.choice(("tls", "")),
+        "sni": host,
+    }
+    encoded = base64.b64encode(json.dumps(params).encode()).decode()
+    return f"vmess://{encoded}"
+
+
+def generate_links(
+    count: int,
+    *,
+    vmess_ratio: float = 0.0,
+    seed: int = 0,
+) -> list[str]:
+    rnd = random.Random(seed)  # noqa: S311
+    return [
+        generate_vmess_link(rnd)
+        if rnd.random() < vmess_ratio
+        else generate_vless_link(rnd)
+        for _ in range(count)
+    ]
+
+
+def generate_local_links(
+    ports: list[int],
+    *,
+    host: str = "127.0.0.1",
+    vmess_ratio: float = 0.0,
+    seed: int = 0,
+) -> list[str]:
+    """One link per port, all pointing at ``host`` (e.g. a local listener farm)."""
+    rnd = random.Random(seed)  # noqa: S311
+    return [
+        generate_vmess_link(rnd, host, port)
+        if rnd.random() < vmess_ratio
+        else generate_vless_link(rnd, host, port)
+        for port in ports
+    ]
+
+
+def add_duplicates(
+    links: list[str],
+    duplicate_ratio: float,
+    *,
+    seed: int = 0,
+) -> list[str]:
+    """Mix in copies of ``links`` that differ only in the remark or param order."""
+    rnd = random.Random(seed)  # noqa: S311
+    duplicates_count = int(len(links) * duplicate_ratio / (1 - duplicate_ratio))
+    duplicates = []
+    for _ in range(duplicates_count):
+        link, _, _ = rnd.choice(links).partition("#")
+        base, sep, query = link.partition("?")
+        if sep:
+            pairs = query.split("&")
+            rnd.shuffle(pairs)
+            link = f"{base}?{'&'.join(pairs)}"
+        duplicates.append(f"{link}#dup-{rnd.randint(1, 10**6)}")
+    mixed = links + duplicates
+    rnd.shuffle(mixed)
+    return mixed
@@ -0,0 +1,380 @@
+"""In-process stand-in for the xray binary.
+
+``FakeXray`` serves ``HandlerService`` and ``RoutingService`` from the vendored
+``*_pb2_grpc`` servicers and keeps inbounds, outbounds and routing rules in
+memory, with the same tag bookkeeping (and errors) as xray. With ``relay``
+every SOCKS inbound also listens on its port: a CONNECT is routed to the
+outbound's server, which must answer (see ``benchmarks.farm``) before the
+relay replies to the proxied HTTP requests with ``204 No Content`` itself
+(keeping the tunnel open unless asked to close it), so no real site or
+network access is needed.
+
+A ``dead_rate`` share of the servers (picked per address and port) is never
+reachable through the relay, like servers that accept TCP but whose proxy
+does not work.
+
+Every call can be slowed down by ``call_latency`` seconds, and calls to
+``failing_methods`` (all methods by default) fail with probability
+``failure_rate`` (status UNAVAILABLE); ``calls`` and ``failures`` count them
+per method.
+
+``FakeXray.process`` can replace ``XrayPoolHandler.process_manager``: "starting"
+it marks xray as running, "stopping" it drops every handler like a restart.
+"""
+
+import asyncio
+import random
+import socket
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+from src.xray.stubs.app.proxyman.command import command_pb2 as handler_pb2
+from src.xray.stubs.app.proxyman.command.command_pb2_grpc import (
+    HandlerServiceServicer,
+    add_HandlerServiceServicer_to_server,
+)
+from src.xray.stubs.app.proxyman.config_pb2 import ReceiverConfig
+from src.xray.stubs.app.router.command import command_pb2 as router_pb2
+from src.xray.stubs.app.router.command.command_pb2_grpc import (
+    RoutingServiceServicer,
+    add_RoutingServiceServicer_to_server,
+)
+from src.xray.stubs.app.router.config_pb2 import Config as RouterConfig
+from src.xray.stubs.common.net.address_pb2 import IPOrDomain
+from src.xray.stubs.proxy.vless.outbound.config_pb2 import (
+    Config as VlessOutboundConfig,
+)
+from src.xray.stubs.proxy.vmess.outbound.config_pb2 import (
+    Config as VmessOutboundConfig,
+)
+
+SOCKS_VERSION = 5
+SOCKS_OK = b"\x05\x00\x00\x01" + bytes(6)
+SOCKS_HOST_UNREACHABLE = b"\x05\x04\x00\x01" + bytes(6)
+HTTP_NO_CONTENT = b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n"
+
+
+def _address(address: IPOrDomain) -> str:
+    if address.domain:
+        return address.domain
+    if len(address.ip) == 4:  # noqa: PLR2004
+        return socket.inet_ntop(socket.AF_INET, address.ip)
+    return socket.inet_ntop(socket.AF_INET6, address.ip)
+
+
+def _outbound_target(request: handler_pb2.AddOutboundRequest) -> tuple[str, int]:
+    proxy = request.outbound.proxy_settings
+    if proxy.type == VlessOutboundConfig.DESCRIPTOR.full_name:
+        endpoint = VlessOutboundConfig.FromString(proxy.value).vnext[0]
+    else:
+        endpoint = VmessOutboundConfig.FromString(proxy.value).Receiver[0]
+    return _address(endpoint.address), endpoint.port
+
+
+class FakeHandlerService(HandlerServiceServicer):
+    def __init__(self, xray: "FakeXray") -> None:
+        self.xray = xray
+
+    def AddInbound(  # noqa: N802
+        self,
+        request: handler_pb2.AddInboundRequest,
+        context: grpc.ServicerContext,
+    ) -> handler_pb2.AddInboundResponse:
+        self.xray.inject("AddInbound", context)
+        inbound = request.inbound
+        receiver = ReceiverConfig.FromString(inbound.receiver_settings.value)
+        port = receiver.port_list.range[0].From
+        with self.xray.lock:
+            if inbound.tag in self.xray.inbounds:
+                context.abort(grpc.StatusCode.UNKNOWN, f"existing tag: {inbound.tag}")
+            self.xray.inbounds[inbound.tag] = port
+        if self.xray.relay:
+            self.xray.start_relay(inbound.tag, port)
+        return handler_pb2.AddInboundResponse()
+
+    def RemoveInbound(  # noqa: N802
+        self,
+        request: handler_pb2.RemoveInboundRequest,
+        context: grpc.ServicerContext,
+    ) -> handler_pb2.RemoveInboundResponse:
+        self.xray.inject("RemoveInbound", context)
+        with self.xray.lock:
+            if self.xray.inbounds.pop(request.tag, None) is None:
+                context.abort(grpc.StatusCode.UNKNOWN, f"unknown tag: {request.tag}")
+        self.xray.stop_relay(request.tag)
+        return handler_pb2.RemoveInboundResponse()
+
+    def AddOutbound(  # noqa: N802
+        self,
+        request: handler_pb2.AddOutboundRequest,
+        context: grpc.ServicerContext,
+    ) -> handler_pb2.AddOutboundResponse:
+        self.xray.inject("AddOutbound", context)
+        tag = request.outbound.tag
+        with self.xray.lock:
+            if tag in self.xray.outbounds:
+                context.abort(grpc.StatusCode.UNKNOWN, f"existing tag: {tag}")
+            self.xray.outbounds[tag] = _outbound_target(request)
+        return handler_pb2.AddOutboundResponse()
+
+    def RemoveOutbound(  # noqa: N802
+        self,
+        request: handler_pb2.RemoveOutboundRequest,
+        context: grpc.ServicerContext,
+    ) -> handler_pb2.RemoveOutboundResponse:
+        self.xray.inject("RemoveOutbound", context)
+        with self.xray.lock:
+            if self.xray.outbounds.pop(request.tag, None) is None:
+                context.abort(grpc.StatusCode.UNKNOWN, f"unknown tag: {request.tag}")
+        return handler_pb2.RemoveOutboundResponse()
+
+
+class FakeRoutingService(RoutingServiceServicer):
+    def __init__(self, xray: "FakeXray") -> None:
+        self.xray = xray
+
+    def AddRule(  # noqa: N802
+        self,
+        request: router_pb2.AddRuleRequest,
+        context: grpc.ServicerContext,
+    ) -> router_pb2.AddRuleResponse:
+        self.xray.inject("AddRule", context)
+        config = RouterConfig.FromString(request.config.value)
+        with self.xray.lock:
+            for rule in config.rule:
+                for inbound_tag in rule.inbound_tag:
+                    self.xray.routes[inbound_tag] = rule.tag
+                self.xray.rules[rule.rule_tag] = tuple(rule.inbound_tag)
+        return router_pb2.AddRuleResponse()
+
+    def RemoveRule(  # noqa: N802
+        self,
+        request: router_pb2.RemoveRuleRequest,
+        context: grpc.ServicerContext,
+    ) -> router_pb2.RemoveRuleResponse:
+        self.xray.inject("RemoveRule", context)
+        with self.xray.lock:
+            rule_tag = request.ruleTag
+            inbound_tags = self.xray.rules.pop(rule_tag, None)
+            if inbound_tags is None:
+                context.abort(grpc.StatusCode.UNKNOWN, f"unknown rule: {rule_tag}")
+            for inbound_tag in inbound_tags:
+                self.xray.routes.pop(inbound_tag, None)
+        return router_pb2.RemoveRuleResponse()
+
+
+class FakeXrayProcess:
+    """``XrayProcessHandler`` look-alike driving a ``FakeXray``."""
+
+    def __init__(self, xray: "FakeXray") -> None:
+        self.xray = xray
+        self.running = False
+
+    def run(self) -> None:
+        self.running = True
+
+    def stop(self) -> None:
+        self.running = False
+        self.xray.reset()
+
+    def restart(self) -> None:
+        self.stop()
+        self.run()
+
+    def is_running(self) -> bool:
+        return self.running
+
+
+class FakeXray:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        *,
+        relay: bool = False,
+        call_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        failing_methods: frozenset[str] | None = None,
+        dead_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.host = host
+        self.relay = relay
+        self.dead_rate = dead_rate
+        self.seed = seed
+        self.call_latency = call_latency
+        self.failure_rate = failure_rate
+        self.failing_methods = failing_methods
+        self.calls: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        self._random = random.Random(seed)  # noqa: S311
+        self.lock = threading.Lock()
+        self.inbounds: dict[str, int] = {}
+        self.outbounds: dict[str, tuple[str, int]] = {}
+        self.rules: dict[str, tuple[str, ...]] = {}
+        self.routes: dict[str, str] = {}  # inbound tag -> outbound tag
+        self.process = FakeXrayProcess(self)
+        self.api_url = ""
+        self._server: grpc.Server | None = None
+        self._relay_loop: asyncio.AbstractEventLoop | None = None
+        self._relay_thread: threading.Thread | None = None
+        self._relay_servers: dict[str, asyncio.Server] = {}
+
+    def start(self, max_workers: int = 8) -> str:
+        """Start serving the API and return its address for ``XrayApi``."""
+        self._server = grpc.server(ThreadPoolExecutor(max_workers=max_workers))
+        add_HandlerServiceServicer_to_server(FakeHandlerService(self), self._server)
+        add_RoutingServiceServicer_to_server(FakeRoutingService(self), self._server)
+        port = self._server.add_insecure_port(f"{self.host}:0")
+        self._server.start()
+        if self.relay:
+            self._relay_loop = asyncio.new_event_loop()
+            self._relay_thread = threading.Thread(
+                target=self._relay_loop.run_forever,
+                name="fake-xray-relay",
+                daemon=True,
+            )
+            self._relay_thread.start()
+        self.api_url = f"{self.host}:{port}"
+        return self.api_url
+
+    def shutdown(self) -> None:
+        self.reset()
+        if self._server:
+            self._server.stop(grace=None)
+            self._server = None
+        if self._relay_loop and self._relay_thread:
+            asyncio.run_coroutine_threadsafe(
+                self._cancel_relay_tasks(),
+                self._relay_loop,
+            ).result()
+            self._relay_loop.call_soon_threadsafe(self._relay_loop.stop)
+            self._relay_thread.join()
+            self._relay_loop.close()
+            self._relay_loop = self._relay_thread = None
+
+    def inject(self, method: str, context: grpc.ServicerContext) -> None:
+        """Apply the configured latency and failure rate to one call."""
+        with self.lock:
+            self.calls[method] += 1
+            failed = (
+                self.failing_methods is None or method in self.failing_methods
+            ) and self._random.random() < self.failure_rate
+            self.failures[method] += failed
+        if self.call_latency:
+            time.sleep(self.call_latency)
+        if failed:
+            context.abort(grpc.StatusCode.UNAVAILABLE, f"injected {method} failure")
+
+    def reset(self) -> None:
+        """Drop every handler and rule, like an xray restart."""
+        with self.lock:
+            inbound_tags = list(self.inbounds)
+            self.inbounds.clear()
+            self.outbounds.clear()
+            self.rules.clear()
+            self.routes.clear()
+        for tag in inbound_tags:
+            self.stop_relay(tag)
+
+    def start_relay(self, tag: str, port: int) -> None:
+        if self._relay_loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self._start_relay(tag, port),
+            self._relay_loop,
+        ).result()
+
+    def stop_relay(self, tag: str) -> None:
+        if self._relay_loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(
+            self._stop_relay(tag),
+            self._relay_loop,
+        ).result()
+
+    async def _start_relay(self, tag: str, port: int) -> None:
+        self._relay_servers[tag] = await asyncio.start_server(
+            lambda reader, writer: self._handle_socks(tag, reader, writer),
+            self.host,
+            port,
+            reuse_address=True,
+        )
+
+    async def _stop_relay(self, tag: str) -> None:
+        if relay_server := self._relay_servers.pop(tag, None):
+            relay_server.close()
+
+    async def _cancel_relay_tasks(self) -> None:
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _route(self, inbound_tag: str) -> tuple[str, int] | None:
+        with self.lock:
+            outbound_tag = self.routes.get(inbound_tag)
+            return self.outbounds.get(outbound_tag) if outbound_tag else None
+
+    async def _handle_socks(
+        self,
+        inbound_tag: str,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            version, methods = await reader.readexactly(2)
+            await reader.readexactly(methods)
+            if version != SOCKS_VERSION:
+                return
+            writer.write(b"\x05\x00")
+            _, _, _, address_type = await reader.readexactly(4)
+            if address_type == 1:
+                await reader.readexactly(4)
+            elif address_type == 3:  # noqa: PLR2004
+                await reader.readexactly((await reader.readexactly(1))[0])
+            else:
+                await reader.readexactly(16)
+            await reader.readexactly(2)  # destination port
+
+            target = self._route(inbound_tag)
+            if (
+                target is None
+                or self._is_dead(*target)
+                or not await self._reach_server(*target)
+            ):
+                writer.write(SOCKS_HOST_UNREACHABLE)
+                return
+            writer.write(SOCKS_OK)
+            # Keep-alive: answer every request on the tunnel until the client
+            # closes it or asks to
+            while request := await reader.readuntil(b"\r\n\r\n"):
+                writer.write(HTTP_NO_CONTENT)
+                await writer.drain()
+                if b"\r\nconnection: close" in request.lower():
+                    break
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    def _is_dead(self, address: str, port: int) -> bool:
+        key = f"{self.seed}/{address}:{port}".encode()
+        return zlib.crc32(key) / 2**32 < self.dead_rate
+
+    async def _reach_server(self, address: str, port: int) -> bool:
+        """Connect to the outbound's server and wait for its first byte."""
+        try:
+            reader, writer = await asyncio.open_connection(address, port)
+        except OSError:
+            return False
+        try:
+            return bool(await reader.read(1))
+        except OSError:
+            return False
+        finally:
+            writer.close()
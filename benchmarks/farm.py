@@ -0,0 +1,80 @@
+"""Local listener farm shared by the connect-stage and pipeline benchmarks."""
+
+import asyncio
+import random
+import resource
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import partial
+
+from src.server.parser import parse_url
+from src.server.schema import Server
+
+# Sent by a farm listener once its injected latency has elapsed
+READY_BYTE = b"\x00"
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def raise_nofile_limit() -> None:
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+
+
+async def _handle(
+    latency: float,
+    _: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> None:
+    if latency:
+        await asyncio.sleep(latency)
+    try:
+        writer.write(READY_BYTE)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+@asynccontextmanager
+async def listener_farm(
+    listeners: int,
+    *,
+    max_latency: float = 0.0,
+    drop_rate: float = 0.0,
+    seed: int = 0,
+) -> AsyncIterator[list[Server]]:
+    """Start ``listeners`` loopback servers and yield one ``Server`` per port.
+
+    Every listener answers with ``READY_BYTE`` after its own latency, drawn
+    uniformly from ``[0, max_latency]``. A ``drop_rate`` share of the ports is
+    closed before the farm is yielded, so connecting to them is refused. The TCP
+    handshake itself is completed by the kernel, so latency only shows up in
+    stages that wait for the server to answer (e.g. the fake xray relay).
+    """
+    rnd = random.Random(seed)  # noqa: S311
+    farm = []
+    dropped = []
+    servers = []
+    for _ in range(listeners):
+        latency = rnd.uniform(0, max_latency) if max_latency else 0.0
+        farm_server = await asyncio.start_server(
+            partial(_handle, latency),
+            "127.0.0.1",
+            0,
+        )
+        port = farm_server.sockets[0].getsockname()[1]
+        (dropped if rnd.random() < drop_rate else farm).append(farm_server)
+        servers.append(parse_url(f"vless://bench@127.0.0.1:{port}"))
+    # Closed only once every port is bound, so the freed ports are not reused
+    for farm_server in dropped:
+        farm_server.close()
+    try:
+        yield servers
+    finally:
+        for farm_server in farm:
+            farm_server.close()
@@ -0,0 +1,20 @@
+import logging
+import pathlib
+
+from src.daemon import ProbeDaemon
+from src.event_loop import run
+from src.logger_config import setup_logging
+
+pathlib.Path("logs").mkdir(parents=True, exist_ok=True)
+setup_logging(debug=False)
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    logger.info("start vpn-topservers daemon!")
+    daemon = ProbeDaemon("instanbul.txt")
+    await daemon.run()
+
+
+if __name__ == "__main__":
+    run(main())
@@ -1,8 +1,10 @@
-import asyncio
 import logging
 import pathlib
 
-from server.server import ServerDumper, ServerManager
+from server.server import ServerDumper, ServerExporter, ServerManager
+from src import metrics, tracing
+from src.config import settings
+from src.event_loop import run
 from src.logger_config import setup_logging
 from src.subscription import SubscriptionManager
 
@@ -14,19 +16,31 @@ def setup_env() -> None:
     pathlib.Path("logs").mkdir(parents=True, exist_ok=True)
 
 
+@tracing.traced("run")
 async def main() -> None:
     setup_env()
     logger.debug("start vpn-topservers!")
-    subscription = SubscriptionManager()
-    subscription.add_subscription_from_file("instanbul.txt")
-    await subscription.fetch_subscriptions_content()
-    server_manager = ServerManager()
-    server_manager.add_from_subscriptions(subscription.subscriptions)
-    await server_manager.filter_alive_connection_servers()
-    await server_manager.filter_alive_http_servers()
-    dumper = ServerDumper()
-    dumper.write_servers_dump(server_manager.servers)
+    async with metrics.file_dump():
+        subscription = SubscriptionManager()
+        subscription.add_subscription_from_file("instanbul.txt")
+        server_manager = ServerManager()
+        subscriptions = server_manager.subscriptions_to_fetch(
+            subscription.subscriptions,
+        )
+        await subscription.fetch_subscriptions_content(subscriptions=subscriptions)
+        server_manager.add_from_subscriptions(subscriptions)
+        await server_manager.filter_alive_connection_servers()
+        if settings.TLS_PROBER_ENABLED:
+            await server_manager.filter_alive_tls_servers()
+        await server_manager.filter_alive_http_servers()
+        if settings.BANDIT_RANKING_ENABLED:
+            top = await server_manager.rank_top_servers()
+            ServerExporter().write_subscription(top.servers)
+        server_manager.update_subscription_quality()
+        server_manager.save_history()
+        dumper = ServerDumper()
+        dumper.write_servers_dump(server_manager.servers)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
@@ -0,0 +1,335 @@
+import asyncio
+import errno
+import logging
+import statistics
+import time
+from collections import deque
+from types import TracebackType
+
+from src import metrics
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by this host running out of resources, not by the probed server
+LOCAL_ERRNOS = frozenset(
+    (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL, errno.ENOMEM),
+)
+
+
+def is_local_error(error: BaseException) -> bool:
+    return isinstance(error, OSError) and error.errno in LOCAL_ERRNOS
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task that sleeps ``interval``.
+
+    Recent samples are kept so the lag during a given time span can be looked up.
+    """
+
+    def __init__(self, interval: float = 0.05, history: int = 1200) -> None:
+        self.interval = interval
+        self.lag = 0.0
+        self._max_lag = 0.0
+        self._samples: deque[tuple[float, float]] = deque(maxlen=history)
+        self._task: asyncio.Task | None = None
+
+    def ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def pop_max_lag(self) -> float:
+        """Return the largest lag seen since the previous call."""
+        max_lag, self._max_lag = self._max_lag, 0.0
+        return max_lag
+
+    def max_lag_since(self, start: float) -> float:
+        """Return the largest lag sampled after ``start`` (``time.perf_counter``)."""
+        max_lag = self.lag
+        for sampled_at, lag in reversed(self._samples):
+            if sampled_at < start:
+                break
+            max_lag = max(max_lag, lag)
+        return max_lag
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag = max(now - start - self.interval, 0.0)
+            self._max_lag = max(self._max_lag, self.lag)
+            self._samples.append((now, self.lag))
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with AIMD (additive increase, multiplicative decrease).
+
+    Used like a semaphore (``async with limiter:``); each finished operation
+    reports its outcome with :meth:`record`. Every ``window`` outcomes the limit
+    is cut by ``decrease_factor`` when the window shows signs of local overload:
+    resource errors on this host, event-loop lag, or a failure rate / median RTT
+    well above their running baseline (many probed servers are simply dead or
+    far away, so only the excess is attributed to local load). Otherwise, if
+    the limit was actually reached, it grows by ``increase_step``.
+    With ``adaptive=False`` it behaves like a plain semaphore.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        limit: int,
+        min_limit: int = 1,
+        max_limit: int | None = None,
+        *,
+        adaptive: bool = settings.ADAPTIVE_CONCURRENCY,
+        window: int = settings.ADAPTIVE_WINDOW,
+        increase_step: int = settings.ADAPTIVE_INCREASE_STEP,
+        decrease_factor: float = settings.ADAPTIVE_DECREASE_FACTOR,
+        failure_threshold: float = settings.ADAPTIVE_FAILURE_THRESHOLD,
+        loop_lag_threshold: float = settings.ADAPTIVE_LOOP_LAG_THRESHOLD,
+        rtt_inflation: float = settings.ADAPTIVE_RTT_INFLATION,
+        name: str = "limiter",
+    ) -> None:
+        self.limit = limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.adaptive = adaptive
+        self.window = window
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.failure_threshold = failure_threshold
+        self.loop_lag_threshold = loop_lag_threshold
+        self.rtt_inflation = rtt_inflation
+        self.lag_monitor = LoopLagMonitor()
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._saturated = False
+        self._outcomes = 0
+        self._failures = 0
+        self._local_failures = 0
+        self._rtts: list[float] = []
+        self._base_failure_rate: float | None = None
+        self._base_rtt: float | None = None
+        # Both gauges hand out labels the same way, so they agree on the suffix
+        self.name = metrics.LIMITER_IN_FLIGHT.track_instance(self, "in_flight", name)
+        metrics.LIMITER_LIMIT.labels(self.name).track(self, "limit")
+
+    async def acquire(self) -> None:
+        if self.adaptive:
+            self.lag_monitor.ensure_started()
+        if self.in_flight >= self.limit or self._waiters:
+            self._saturated = True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            # Waiters cancelled earlier may still block the queue head
+            self._wake_waiters()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+        else:
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """Take a slot without waiting; a refusal counts as saturation."""
+        if self.adaptive:
+            self.lag_monitor.ensure_started()
+        if self.in_flight >= self.limit or self._waiters:
+            self._saturated = True
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.release()
+
+    def record(
+        self,
+        *,
+        success: bool,
+        rtt: float | None = None,
+        local_failure: bool = False,
+    ) -> None:
+        if not self.adaptive:
+            return
+        self._outcomes += 1
+        if success:
+            if rtt is not None:
+                self._rtts.append(rtt)
+        else:
+            self._failures += 1
+            self._local_failures += local_failure
+        if self._outcomes >= self.window:
+            self._adjust()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _adjust(self) -> None:
+        failure_rate = self._failures / self._outcomes
+        median_rtt = statistics.median(self._rtts) if self._rtts else None
+        loop_lag = self.lag_monitor.pop_max_lag()
+        if self._base_failure_rate is None:
+            self._base_failure_rate = failure_rate
+        if self._base_rtt is None:
+            self._base_rtt = median_rtt
+
+        reason = ""
+        if self._local_failures:
+            reason = f"{self._local_failures} local errors"
+        elif failure_rate - self._base_failure_rate > self.failure_threshold:
+            reason = f"failure rate {failure_rate:.0%}"
+        elif loop_lag > self.loop_lag_threshold:
+            reason = f"loop lag {loop_lag * 1000:.0f}ms"
+        elif (
+            median_rtt
+            and self._base_rtt
+            and median_rtt > self._base_rtt * self.rtt_inflation
+        ):
+            reason = f"RTT inflation x{median_rtt / self._base_rtt:.2f}"
+
+        if not reason:
+            # Baselines only learn from windows that looked healthy
+            self._base_failure_rate = _ewma(self._base_failure_rate, failure_rate)
+            if median_rtt:
+                self._base_rtt = _ewma(self._base_rtt or median_rtt, median_rtt)
+
+        previous_limit = self.limit
+        if reason:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        elif self._saturated:
+            self.limit = min(self.max_limit, self.limit + self.increase_step)
+        if self.limit != previous_limit:
+            logger.debug(
+                "%s limit %d -> %d (%s)",
+                self.name,
+                previous_limit,
+                self.limit,
+                reason or "increase",
+            )
+            self._wake_waiters()
+
+        self._outcomes = self._failures = self._local_failures = 0
+        self._rtts.clear()
+        self._saturated = bool(self._waiters)
+
+
+class AdaptiveTimeout:
+    """Deadline of one probe phase that follows its latency distribution.
+
+    :attr:`value` starts at ``maximum`` and is re-evaluated every
+    ``min_samples`` outcomes. Successes alone are a biased sample (a tight
+    deadline hides the latencies it cuts off), so timeouts are counted too:
+    the timeout rate seen under the full ``maximum`` is the baseline, and a
+    block that times out ``widen_threshold`` more often than that doubles the
+    deadline and drops the old samples. Otherwise the deadline becomes
+    ``multiplier`` x the p95 of the last ``window`` successes, clamped to
+    ``[minimum, maximum]``. Dead servers then give up a slot after a few
+    typical latencies instead of the full configured timeout.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        maximum: float,
+        *,
+        adaptive: bool = settings.ADAPTIVE_TIMEOUT,
+        multiplier: float = settings.ADAPTIVE_TIMEOUT_MULTIPLIER,
+        minimum: float = settings.ADAPTIVE_TIMEOUT_MIN,
+        window: int = settings.ADAPTIVE_TIMEOUT_WINDOW,
+        min_samples: int = settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+        widen_threshold: float = settings.ADAPTIVE_TIMEOUT_WIDEN_THRESHOLD,
+        name: str = "timeout",
+    ) -> None:
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.multiplier = multiplier
+        self.minimum = min(minimum, maximum)
+        self.min_samples = min_samples
+        self.widen_threshold = widen_threshold
+        self.value = maximum
+        self._samples: deque[float] = deque(maxlen=window)
+        self._outcomes = 0
+        self._timeouts = 0
+        self._base_timeout_rate: float | None = None
+        self.name = metrics.PROBE_TIMEOUT.track_instance(self, "value", name)
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a successful operation."""
+        if not self.adaptive:
+            return
+        self._samples.append(latency)
+        self._outcomes += 1
+        if self._outcomes >= self.min_samples:
+            self._adjust()
+
+    def record_timeout(self) -> None:
+        """Record an operation cut off by this deadline."""
+        if not self.adaptive:
+            return
+        self._timeouts += 1
+        self._outcomes += 1
+        if self._outcomes >= self.min_samples:
+            self._adjust()
+
+    def _adjust(self) -> None:
+        timeout_rate = self._timeouts / self._outcomes
+        self._outcomes = self._timeouts = 0
+        previous = self.value
+        if previous >= self.maximum:
+            # Under the full deadline timeouts are servers that are just dead
+            self._base_timeout_rate = (
+                timeout_rate
+                if self._base_timeout_rate is None
+                else _ewma(self._base_timeout_rate, timeout_rate)
+            )
+        elif timeout_rate - (self._base_timeout_rate or 0.0) > self.widen_threshold:
+            self.value = min(previous * 2, self.maximum)
+            self._samples.clear()
+            logger.debug(
+                "%s deadline %.2fs -> %.2fs (timeout rate %.2f)",
+                self.name,
+                previous,
+                self.value,
+                timeout_rate,
+            )
+            return
+        if len(self._samples) < self.min_samples:
+            return
+        p95 = statistics.quantiles(self._samples, n=20)[-1]
+        self.value = min(max(self.multiplier * p95, self.minimum), self.maximum)
+        if abs(self.value - previous) > previous * 0.1:
+            logger.debug(
+                "%s deadline %.2fs -> %.2fs (p95 %.3fs)",
+                self.name,
+                previous,
+                self.value,
+                p95,
+            )
+
+
+def _ewma(average: float, value: float, alpha: float = 0.2) -> float:
+    return average + alpha * (value - average)
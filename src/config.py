@@ -8,6 +8,7 @@ class Settings(BaseSettings):
     APP_NAME: str = "VPN Top Servers"
     DEBUG: bool = True
     PREFFER_PORTS: set = {443}
+    EVENT_LOOP: str = "asyncio"  # "asyncio" or "uvloop" (optional extra)
     # Dir settings
     FILES_DIR: Path = Path(__file__).resolve().parent.parent / "files"
     DUMPS_DIR: Path = FILES_DIR / Path("dumps")
@@ -24,10 +25,26 @@ class Settings(BaseSettings):
     # Connection Prober settings
     CONNECTION_PROBER_TIMEOUT: int = 10
     CONNECTION_PROBER_MAX_CONCURRENT_CONNECTIONS: int = 100
+    CONNECTION_PROBER_MIN_CONCURRENT_CONNECTIONS: int = 10
+    CONNECTION_PROBER_MAX_CONCURRENT_CONNECTIONS_LIMIT: int = 2000
+    # "stream" (asyncio.open_connection), "socket" (raw sock_connect) or
+    # "batch" (thousands of connects on one selector in a worker thread)
+    CONNECTION_PROBER_ENGINE: str = "stream"
+    # Upper bound of a "batch" engine batch; the limiter sets the actual size
+    CONNECTION_PROBER_BATCH_SIZE: int = 1000
+
+    # TLS Prober settings (direct handshake with the server's SNI, no xray)
+    TLS_PROBER_ENABLED: bool = True
+    TLS_PROBER_TIMEOUT: int = 10
+    TLS_PROBER_MAX_CONCURRENT_HANDSHAKES: int = 100
+    TLS_PROBER_MIN_CONCURRENT_HANDSHAKES: int = 10
+    TLS_PROBER_MAX_CONCURRENT_HANDSHAKES_LIMIT: int = 1000
 
     # HTTP Prober settings
     PROXYPROBER_TIMEOUT: int = 10
     HTTP_PROBER_MAX_CONCURRENT_REQUESTS: int = 150
+    HTTP_PROBER_MIN_CONCURRENT_REQUESTS: int = 10
+    HTTP_PROBER_MAX_CONCURRENT_REQUESTS_LIMIT: int = 1000
     HTTP_204_URLS: tuple[str, ...] = (
         "https://www.google.com/generate_204",
         "https://www.cloudflare.com/cdn-cgi/trace",
@@ -39,10 +56,109 @@ class Settings(BaseSettings):
         "https://www.instagram.com/data/manifest.json",
     )
     DONT_ALIVE_CONNECTION_TIME: float = 999.0
+    # How a server's URLs are probed: "parallel" (all at once), "sequential"
+    # (one after another) or "hedged" (the next one also starts if the current
+    # one takes longer than HTTP_PROBER_HEDGE_DELAY). The last two stop at the
+    # first failure and, with HTTP_PROBER_CUTOFF_TOP_K, once the server can no
+    # longer enter the top k, so they take fewer URL samples per server.
+    HTTP_PROBER_URL_POLICY: str = "parallel"
+    HTTP_PROBER_HEDGE_DELAY: float = 1.0
+    HTTP_PROBER_CUTOFF_TOP_K: int = 0  # 0 = measure every URL of alive servers
+    # Requests per URL sent over the connection kept alive after the first
+    # ("cold") one, averaged into response_time.http_warm
+    HTTP_PROBER_WARM_REQUESTS: int = 0  # 0 = a fresh connection for every request
+    # "session" (an AsyncSession request per URL) or "multi" (every request of a
+    # chunk as an easy handle on one curl multi handle; always "parallel" URLs,
+    # no cutoff and no warm requests)
+    HTTP_PROBER_ENGINE: str = "session"
+
+    # Adaptive concurrency (AIMD) settings. The *_MAX_CONCURRENT_* values above
+    # are the starting limits, *_MIN_* and *_LIMIT the bounds.
+    ADAPTIVE_CONCURRENCY: bool = True
+    ADAPTIVE_WINDOW: int = 50  # Outcomes per adjustment
+    ADAPTIVE_INCREASE_STEP: int = 10
+    ADAPTIVE_DECREASE_FACTOR: float = 0.7
+    ADAPTIVE_FAILURE_THRESHOLD: float = 0.2  # Failure rate over the baseline
+    ADAPTIVE_LOOP_LAG_THRESHOLD: float = 0.05  # seconds
+    ADAPTIVE_RTT_INFLATION: float = 2.0  # Median RTT over the baseline
+
+    # Adaptive deadlines: each probe phase times out after
+    # ADAPTIVE_TIMEOUT_MULTIPLIER x the p95 of its recent successes, between
+    # ADAPTIVE_TIMEOUT_MIN and the phase's configured *_TIMEOUT, and doubles
+    # when it times out more often than it did at the configured timeout
+    ADAPTIVE_TIMEOUT: bool = True
+    ADAPTIVE_TIMEOUT_MULTIPLIER: float = 3.0
+    ADAPTIVE_TIMEOUT_MIN: float = 1.0  # seconds
+    ADAPTIVE_TIMEOUT_WINDOW: int = 500  # Recent successes kept
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES: int = 50  # Outcomes per adjustment
+    ADAPTIVE_TIMEOUT_WIDEN_THRESHOLD: float = 0.05  # Timeout rate over the baseline
+
+    # Probe instrumentation settings
+    PROBE_LOOP_LAG_THRESHOLD: float = 0.1  # Flag samples taken under more lag
+    PROBE_REPROBE_LAGGED: bool = True  # Re-measure flagged connection samples
+
+    # Daemon settings
+    DAEMON_SUBSCRIPTION_REFRESH_INTERVAL: int = 3600  # seconds
+    DAEMON_TOP_SERVERS: int = 100  # Servers re-probed on the fast cadence
+    DAEMON_TOP_REPROBE_INTERVAL: int = 300
+    DAEMON_ALIVE_REPROBE_INTERVAL: int = 1800
+    DAEMON_DEAD_REPROBE_INTERVAL: int = 3600
+    DAEMON_DEAD_MAX_BACKOFF: int = 8  # Dead interval multiplier cap
+    DAEMON_PROBE_BATCH_SIZE: int = 500  # Max servers probed per cycle
+    DAEMON_MAX_IDLE: float = 30.0  # Max sleep between scheduler checks
+    DAEMON_EXPORT_FILE: Path = Path("subscription.txt")
+    DAEMON_EXPORT_SERVERS: int = 0  # 0 = all alive servers
+    DAEMON_API_ENABLED: bool = True
+
+    # Probe history (latency/uptime EWMAs per server and subscription), used to
+    # probe the most promising servers first
+    HISTORY_ENABLED: bool = True
+    HISTORY_FILE: Path = FILES_DIR / "history.json"
+    HISTORY_EWMA_ALPHA: float = 0.3
+    HISTORY_EXPIRE_DAYS: float = 30.0  # Forget servers not probed for this long
+    # Subscription quality (needs HISTORY_ENABLED): yield is the EWMA over runs
+    # of expected alive servers per published link
+    SUBSCRIPTION_QUALITY_MIN_RUNS: int = 2  # Runs before a subscription is rated
+    SUBSCRIPTION_LOW_YIELD_RATIO: float = 0.02  # Fetch rarely, probe last
+    SUBSCRIPTION_LOW_YIELD_FETCH_EVERY: int = 4  # Fetch every Nth run
+    SUBSCRIPTION_QUARANTINE_RATIO: float = 0.002  # Do not fetch at all...
+    SUBSCRIPTION_QUARANTINE_DAYS: float = 7.0  # ...for this long
+    # Stop the HTTP stage once this many servers are alive (0 = probe all)
+    HTTP_PROBER_EARLY_EXIT_TOP_K: int = 0
+
+    # Best-arm top-k ranking: extra HTTP probes go to servers whose confidence
+    # interval straddles the top-k boundary, until the budget is spent
+    BANDIT_RANKING_ENABLED: bool = False
+    BANDIT_TOP_K: int = 20
+    BANDIT_PROBE_BUDGET: int = 2000  # HTTP requests the ranker may spend
+    BANDIT_DELTA: float = 0.05  # Target error probability of the top-k set
+    BANDIT_EPSILON: float = 0.05  # Latency difference treated as a tie (s)
+    BANDIT_LATENCY_SIGMA: float = 0.3  # Sub-Gaussian scale of latency noise (s)
+
+    # Metrics (Prometheus text format): served at /metrics by the daemon API and,
+    # if METRICS_FILE is set, rewritten every METRICS_DUMP_INTERVAL seconds
+    METRICS_FILE: str = ""
+    METRICS_DUMP_INTERVAL: float = 15.0
+
+    # Tracing: OTLP/JSON spans appended to TRACE_FILE (one request per line)
+    TRACING_ENABLED: bool = False
+    TRACE_FILE: Path = Path("logs") / "traces.jsonl"
+
+    # Top servers HTTP API settings
+    API_HOST: str = "127.0.0.1"
+    API_PORT: int = 8081
 
     # Logging settings
     LOG_LEVEL: str = "INFO"
     LOG_FILE_PATH: Path = Path("logs/app.log")
+    # Format and write records in a listener thread instead of the event loop
+    LOG_QUEUE_ENABLED: bool = True
+    # Keep 1 of N DEBUG records per logger (per-server/per-link events)
+    LOG_SAMPLE_RATES: dict[str, int] = {
+        "src.prober": 100,
+        "src.xray.handlers": 100,
+        "src.server.parser": 100,
+    }
 
     # Pydantic model configuration
     model_config = SettingsConfigDict(
@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from pathlib import Path
+
+from src import metrics
+from src.config import settings
+from src.http_api import TopServersApi
+from src.server.schema import Server
+from src.server.server import ServerExporter, ServerManager
+from src.subscription import SubscriptionManager
+
+logger = logging.getLogger(__name__)
+
+
+def is_alive(server: Server) -> bool:
+    return (
+        server.response_time.connection < settings.DONT_ALIVE_CONNECTION_TIME
+        and server.response_time.tls < settings.DONT_ALIVE_CONNECTION_TIME
+        and bool(server.response_time.http)
+        and sum(server.response_time.http.values())
+        < settings.DONT_ALIVE_CONNECTION_TIME
+    )
+
+
+class ProbeDaemon:
+    """Long-running prober.
+
+    Keeps the subscriptions, the parsed server catalog, the xray pool and the
+    HTTP session alive between cycles, and re-probes every server on its own
+    cadence: top servers often, other alive servers less often and dead ones
+    with a growing backoff. The exported subscription is rewritten and the
+    HTTP API ranking refreshed after each cycle.
+    """
+
+    def __init__(
+        self,
+        subscription_file: str | Path,
+        export_filename: str | Path = settings.DAEMON_EXPORT_FILE,
+    ) -> None:
+        self.subscription_file = subscription_file
+        self.export_filename = export_filename
+        self.subscription_manager = SubscriptionManager()
+        self.server_manager = ServerManager()
+        self.exporter = ServerExporter()
+        self.api = TopServersApi()
+        self.ranked_servers: list[Server] = []
+        self._queue: list[tuple[float, int, Server]] = []
+        self._queue_counter = itertools.count()
+        self._scheduled: set[Server] = set()
+        self._top_servers: set[Server] = set()
+        self._dead_streaks: dict[Server, int] = {}
+        self._next_refresh = 0.0
+
+    async def run(self) -> None:
+        self.subscription_manager.add_subscription_from_file(self.subscription_file)
+        if settings.DAEMON_API_ENABLED:
+            await self.api.start()
+        try:
+            async with metrics.file_dump():
+                while True:
+                    if time.monotonic() >= self._next_refresh:
+                        await self.refresh_subscriptions()
+                    if due_servers := self._pop_due_servers():
+                        await self.probe(due_servers)
+                        self.update_ranking()
+                        self._reschedule(due_servers)
+                    await asyncio.sleep(self._idle_time())
+        finally:
+            await self.api.stop()
+            await self.server_manager.http_prober.close()
+            self.server_manager.save_history()
+
+    async def refresh_subscriptions(self) -> None:
+        # Rate the subscriptions on the probes since the previous refresh
+        self.server_manager.update_subscription_quality()
+        subscriptions = self.server_manager.subscriptions_to_fetch(
+            self.subscription_manager.subscriptions,
+        )
+        await self.subscription_manager.fetch_subscriptions_content(
+            timeout=settings.SUBSCRIPTION_TIMEOUT,
+            concurent_connections=settings.SUBSCRIPTION_MAX_CONCURRENT_CONNECTIONS,
+            subscriptions=subscriptions,
+        )
+        self.server_manager.add_from_subscriptions(subscriptions)
+        # A failed fetch keeps the subscription's previous links
+        removed_servers = self.server_manager.drop_unlisted(
+            self.subscription_manager.subscriptions,
+            kept_subscription_urls={
+                subscription.url
+                for subscription in self.subscription_manager.subscriptions
+            }
+            - {subscription.url for subscription in subscriptions},
+        )
+        self._forget(removed_servers)
+        now = time.monotonic()
+        new_servers = self.server_manager.servers - self._scheduled
+        for server in new_servers:
+            self._schedule(server, now)
+        self._next_refresh = now + settings.DAEMON_SUBSCRIPTION_REFRESH_INTERVAL
+        self.server_manager.save_history()
+        logger.info(
+            "Subscriptions refreshed: %d new servers, %d removed, %d in catalog.",
+            len(new_servers),
+            len(removed_servers),
+            len(self.server_manager.servers),
+        )
+
+    async def probe(self, servers: list[Server]) -> None:
+        history = self.server_manager.history
+        if settings.HISTORY_ENABLED:
+            servers = history.order(servers)
+        for server in servers:
+            server.response_time.reset()
+        await self.server_manager.connection_prober.probe(servers)
+        connected = [
+            server
+            for server in servers
+            if server.response_time.connection < settings.DONT_ALIVE_CONNECTION_TIME
+        ]
+        if settings.TLS_PROBER_ENABLED and connected:
+            await self.server_manager.tls_prober.probe(connected)
+            connected = [
+                server
+                for server in connected
+                if server.response_time.tls < settings.DONT_ALIVE_CONNECTION_TIME
+            ]
+        if connected:
+            await self.server_manager.http_prober.probe(connected, keep_alive=True)
+        if settings.HISTORY_ENABLED:
+            for server in servers:
+                http = server.response_time.http
+                history.observe(
+                    server,
+                    sum(http.values()) / len(http) if is_alive(server) else None,
+                )
+        logger.info(
+            "Probed %d servers: %d connected, %d alive.",
+            len(servers),
+            len(connected),
+            sum(is_alive(server) for server in connected),
+        )
+
+    def update_ranking(self) -> None:
+        self.ranked_servers = sorted(
+            filter(is_alive, self.server_manager.servers),
+            key=lambda s: s.response_time.http_total,
+        )
+        self._top_servers = set(self.ranked_servers[: settings.DAEMON_TOP_SERVERS])
+        self.api.update(self.ranked_servers)
+        export_amount = settings.DAEMON_EXPORT_SERVERS or len(self.ranked_servers)
+        self.exporter.write_subscription(
+            self.ranked_servers[:export_amount],
+            self.export_filename,
+        )
+
+    def _forget(self, servers: set[Server]) -> None:
+        """Drop removed servers from the schedule and the ranking."""
+        if not servers:
+            return
+        self._queue = [entry for entry in self._queue if entry[2] not in servers]
+        heapq.heapify(self._queue)
+        self._scheduled -= servers
+        self._top_servers -= servers
+        for server in servers:
+            self._dead_streaks.pop(server, None)
+        self.ranked_servers = [
+            server for server in self.ranked_servers if server not in servers
+        ]
+        self.api.update(self.ranked_servers)
+
+    def _schedule(self, server: Server, due: float) -> None:
+        heapq.heappush(self._queue, (due, next(self._queue_counter), server))
+        self._scheduled.add(server)
+
+    def _pop_due_servers(self) -> list[Server]:
+        now = time.monotonic()
+        due_servers = []
+        while (
+            self._queue
+            and self._queue[0][0] <= now
+            and len(due_servers) < settings.DAEMON_PROBE_BATCH_SIZE
+        ):
+            _, _, server = heapq.heappop(self._queue)
+            self._scheduled.discard(server)
+            due_servers.append(server)
+        return due_servers
+
+    def _reschedule(self, servers: list[Server]) -> None:
+        now = time.monotonic()
+        for server in servers:
+            self._schedule(server, now + self._reprobe_interval(server))
+
+    def _reprobe_interval(self, server: Server) -> float:
+        if not is_alive(server):
+            streak = self._dead_streaks.get(server, 0) + 1
+            self._dead_streaks[server] = streak
+            backoff = min(streak, settings.DAEMON_DEAD_MAX_BACKOFF)
+            return settings.DAEMON_DEAD_REPROBE_INTERVAL * backoff
+        self._dead_streaks.pop(server, None)
+        if server in self._top_servers:
+            return settings.DAEMON_TOP_REPROBE_INTERVAL
+        return settings.DAEMON_ALIVE_REPROBE_INTERVAL
+
+    def _idle_time(self) -> float:
+        next_event = self._next_refresh
+        if self._queue:
+            next_event = min(next_event, self._queue[0][0])
+        return min(
+            max(next_event - time.monotonic(), 0.0),
+            settings.DAEMON_MAX_IDLE,
+        )
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOPS = ("asyncio", "uvloop")
+
+
+def get_loop_factory(
+    name: str = settings.EVENT_LOOP,
+) -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Return the loop factory for ``asyncio.run`` (``None`` = default loop)."""
+    if name == "asyncio":
+        return None
+    if name == "uvloop":
+        try:
+            import uvloop  # noqa: PLC0415
+        except ImportError:
+            logger.warning(
+                "uvloop is not installed (pip install vpn-topservers[uvloop]), "
+                "falling back to the asyncio event loop.",
+            )
+            return None
+        return uvloop.new_event_loop
+    msg = f"Unknown event loop {name!r}, expected one of: {', '.join(EVENT_LOOPS)}"
+    raise ValueError(msg)
+
+
+def run[T](
+    main: Coroutine[Any, Any, T],
+    event_loop: str = settings.EVENT_LOOP,
+) -> T:
+    """``asyncio.run`` on the event loop selected in the settings."""
+    return asyncio.run(main, loop_factory=get_loop_factory(event_loop))
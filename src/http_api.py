@@ -0,0 +1,210 @@
+import asyncio
+import base64
+import contextlib
+import hashlib
+import logging
+from collections.abc import Callable, Iterable
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from src import metrics
+from src.config import settings
+from src.server.schema import Server
+from src.server.server import ServerExporter
+
+logger = logging.getLogger(__name__)
+
+RANKING_METRICS: dict[str, Callable[[Server], float]] = {
+    "http": lambda s: s.response_time.http_total,
+    "connection": lambda s: s.response_time.connection,
+    "http_warm": lambda s: (
+        sum(s.response_time.http_warm.values())
+        if s.response_time.http_warm
+        else float("inf")
+    ),
+}
+SUBSCRIPTION_PATHS = frozenset(("/", "/subscription"))
+METRICS_PATH = "/metrics"
+MAX_CACHED_BODIES = 256
+
+
+class BadRequestError(ValueError):
+    pass
+
+
+class TopServersApi:
+    """Serves the current ranking as a subscription over HTTP.
+
+    ``GET /subscription?count=&protocol=&port=&metric=&format=`` returns the
+    servers given to :meth:`update`, best first. Encoded bodies and
+    their ETags are cached until the next ranking change, so repeated polls
+    only cost a dict lookup (or a 304). ``GET /metrics`` returns the pipeline
+    metrics in the Prometheus text format.
+    """
+
+    def __init__(
+        self,
+        host: str = settings.API_HOST,
+        port: int = settings.API_PORT,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.exporter = ServerExporter()
+        self._version = 0
+        self._rankings: dict[str, list[Server]] = {
+            metric: [] for metric in RANKING_METRICS
+        }
+        self._signature: dict[str, list[str]] = {}
+        self._bodies: dict[tuple, tuple[str, bytes]] = {}
+        self._server: asyncio.Server | None = None
+
+    def update(self, servers: Iterable[Server]) -> None:
+        servers = list(servers)
+        rankings = {
+            metric: sorted(servers, key=key) for metric, key in RANKING_METRICS.items()
+        }
+        signature = {
+            metric: [server.raw_url for server in ranking]
+            for metric, ranking in rankings.items()
+        }
+        if signature == self._signature:
+            return
+        self._rankings = rankings
+        self._signature = signature
+        self._version += 1
+        self._bodies.clear()
+        # Warm the cache for the default (full ranking) bodies
+        for body_format in ("base64", "plain"):
+            self.render({"format": [body_format]})
+        logger.debug("API ranking updated (version %d).", self._version)
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            self.host,
+            self.port,
+        )
+        logger.info("Top servers API listening on http://%s:%d", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def render(self, query: dict[str, list[str]]) -> tuple[str, bytes]:
+        """Return ``(etag, body)`` for the given query parameters."""
+        key = self._parse_query(query)
+        if cached := self._bodies.get(key):
+            return cached
+        count, protocol, port, metric, body_format = key
+        servers = (
+            server
+            for server in self._rankings[metric]
+            if (not protocol or server.protocol == protocol)
+            and (not port or server.port == port)
+        )
+        if count:
+            servers = (server for _, server in zip(range(count), servers))
+        body = self.exporter.generate_subscription(servers).encode("utf-8")
+        if body_format == "base64":
+            body = base64.b64encode(body)
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if len(self._bodies) >= MAX_CACHED_BODIES:
+            self._bodies.clear()
+        self._bodies[key] = (etag, body)
+        return etag, body
+
+    def _parse_query(self, query: dict[str, list[str]]) -> tuple:
+        def get_param(key: str, default: str = "") -> str:
+            return query.get(key, [default])[0]
+
+        try:
+            count = int(get_param("count", "0"))
+            port = int(get_param("port", "0"))
+        except ValueError as e:
+            msg = "count and port must be integers"
+            raise BadRequestError(msg) from e
+        metric = get_param("metric", "http")
+        body_format = get_param("format", "base64")
+        if count < 0 or metric not in RANKING_METRICS:
+            msg = f"Bad count or metric (metrics: {', '.join(RANKING_METRICS)})"
+            raise BadRequestError(msg)
+        if body_format not in ("base64", "plain"):
+            msg = "format must be base64 or plain"
+            raise BadRequestError(msg)
+        return count, get_param("protocol"), port, metric, body_format
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            await self._respond(reader, writer)
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _respond(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            status, headers, body = self._handle_request(request.decode("latin-1"))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+            # OSError covers timeouts and clients resetting the connection
+            return
+        head = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        head.extend((f"Content-Length: {len(body)}", "Connection: close", "", ""))
+        writer.write("\r\n".join(head).encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except OSError:
+            logger.debug("API client disconnected before the response was sent.")
+
+    def _handle_request(
+        self,
+        request: str,
+    ) -> tuple[HTTPStatus, dict[str, str], bytes]:
+        request_line, *header_lines = request.split("\r\n")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {}, b""
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "GET"}, b""
+        url = urlsplit(target)
+        if url.path == METRICS_PATH:
+            headers = {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+            return HTTPStatus.OK, headers, metrics.REGISTRY.render().encode("utf-8")
+        if url.path not in SUBSCRIPTION_PATHS:
+            return HTTPStatus.NOT_FOUND, {}, b""
+        try:
+            etag, body = self.render(parse_qs(url.query))
+        except BadRequestError as e:
+            return HTTPStatus.BAD_REQUEST, {}, str(e).encode("utf-8")
+
+        headers = {
+            "Content-Type": "text/plain; charset=utf-8",
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+        }
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "if-none-match" and etag_matches(value, etag):
+                return HTTPStatus.NOT_MODIFIED, headers, b""
+        return HTTPStatus.OK, headers, body
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` value."""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()  # noqa: PLW2901
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,94 @@
+import logging
+from dataclasses import dataclass
+
+from src import metrics
+from src.concurrency import LoopLagMonitor
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ProbeTiming:
+    queue_wait: float  # Time spent waiting for a concurrency slot
+    network: float  # Time of the measured operation itself
+    loop_lag: float  # Worst event-loop lag while the operation ran
+    success: bool
+    flagged: bool  # Loop lag was above the threshold, network time is unreliable
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class ProbeStats:
+    """Per-stage probe timings split into queue wait, loop lag and network time."""
+
+    def __init__(
+        self,
+        stage: str,
+        lag_monitor: LoopLagMonitor,
+        lag_threshold: float = settings.PROBE_LOOP_LAG_THRESHOLD,
+    ) -> None:
+        self.stage = stage
+        self._probes_ok = metrics.PROBES.labels(stage.lower(), "ok")
+        self._probes_failed = metrics.PROBES.labels(stage.lower(), "failed")
+        self._latency = metrics.PROBE_LATENCY.labels(stage.lower())
+        self.lag_monitor = lag_monitor
+        self.lag_threshold = lag_threshold
+        self.timings: list[ProbeTiming] = []
+
+    def record(
+        self,
+        queued_at: float,
+        started_at: float,
+        network: float,
+        *,
+        success: bool,
+    ) -> ProbeTiming:
+        """Record a probe queued at ``queued_at`` that got its slot at ``started_at``."""
+        loop_lag = self.lag_monitor.max_lag_since(started_at)
+        timing = ProbeTiming(
+            queue_wait=started_at - queued_at,
+            network=network,
+            loop_lag=loop_lag,
+            success=success,
+            flagged=loop_lag > self.lag_threshold,
+        )
+        self.timings.append(timing)
+        if success:
+            self._probes_ok.inc()
+            self._latency.observe(network)
+        else:
+            self._probes_failed.inc()
+        return timing
+
+    def reset(self) -> None:
+        self.timings.clear()
+
+    def summary(self) -> str:
+        succeeded = [timing for timing in self.timings if timing.success]
+        lines = [
+            f"{self.stage} probes: {len(self.timings)} "
+            f"({len(self.timings) - len(succeeded)} failed, "
+            f"{sum(timing.flagged for timing in self.timings)} flagged for loop lag "
+            f"> {self.lag_threshold * 1000:.0f}ms)",
+        ]
+        for name, values in (
+            ("queue wait", [timing.queue_wait for timing in self.timings]),
+            ("loop lag", [timing.loop_lag for timing in self.timings]),
+            ("network", [timing.network for timing in succeeded]),
+        ):
+            lines.append(
+                f"  {name:<10} p50={_percentile(values, 0.5) * 1000:8.1f}ms "
+                f"p95={_percentile(values, 0.95) * 1000:8.1f}ms "
+                f"max={max(values, default=0.0) * 1000:8.1f}ms",
+            )
+        return "\n".join(lines)
+
+    def log_summary(self) -> None:
+        if self.timings:
+            logger.info("%s", self.summary())
@@ -1,4 +1,12 @@
+import atexit
+import copy
 import logging.config
+import logging.handlers
+import queue
+from collections.abc import Mapping
+from pathlib import Path
+
+from src.config import settings
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -34,7 +42,93 @@ LOGGING_CONFIG = {
 }
 
 
-def setup_logging(*, debug: bool = False) -> None:
-    if "handlers" in LOGGING_CONFIG and "console" in LOGGING_CONFIG["handlers"]:
-        LOGGING_CONFIG["handlers"]["console"]["level"] = "DEBUG" if debug else "INFO"
-    logging.config.dictConfig(LOGGING_CONFIG)
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records with their message rendered; the listener does the rest.
+
+    Log arguments can be mutable (a ``Server`` repr includes its
+    ``response_time``), so ``msg % args`` is rendered on the logging thread.
+    Unlike the stock ``prepare``, the formatter (timestamp, level, traceback)
+    runs on the listener thread only, with each handler's own format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Pass one in ``rate`` DEBUG records; INFO and above always pass."""
+
+    def __init__(self, rate: int = 1) -> None:
+        super().__init__()
+        self.rate = rate
+        self._seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 1:
+            return True
+        self._seen += 1
+        return self._seen % self.rate == 1
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(
+    *,
+    debug: bool = False,
+    use_queue: bool = settings.LOG_QUEUE_ENABLED,
+    sample_rates: Mapping[str, int] = settings.LOG_SAMPLE_RATES,
+) -> None:
+    global _listener  # noqa: PLW0603
+    stop_queue_listener()
+    config = copy.deepcopy(LOGGING_CONFIG)
+    config["handlers"]["console"]["level"] = "DEBUG" if debug else "INFO"
+    config["filters"] = {
+        f"sample:{name}": {"()": SamplingFilter, "rate": rate}
+        for name, rate in sample_rates.items()
+    }
+    config["loggers"] = {
+        name: {"filters": [f"sample:{name}"]} for name in sample_rates
+    }
+    # dictConfig adds logger filters without removing the old ones
+    for logger in logging.root.manager.loggerDict.values():
+        if isinstance(logger, logging.Logger):
+            for log_filter in logger.filters[:]:
+                if isinstance(log_filter, SamplingFilter):
+                    logger.removeFilter(log_filter)
+    Path(config["handlers"]["file"]["filename"]).parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+    logging.config.dictConfig(config)
+
+    if use_queue:
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        for handler in handlers:
+            root.removeHandler(handler)
+        queue_handler = LazyQueueHandler(log_queue)
+        # Records no handler would emit are dropped before being rendered
+        queue_handler.setLevel(min(handler.level for handler in handlers))
+        root.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(
+            log_queue,
+            *handlers,
+            respect_handler_level=True,
+        )
+        _listener.start()
+
+
+def stop_queue_listener() -> None:
+    """Drain the queue into the real handlers and stop the listener thread."""
+    global _listener  # noqa: PLW0603
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_queue_listener)
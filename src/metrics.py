@@ -0,0 +1,390 @@
+"""Pipeline metrics in the Prometheus text exposition format.
+
+A small dependency-free subset of ``prometheus_client``: counters, gauges and
+histograms with labels, kept in a registry that renders to text. The daemon
+serves it at ``/metrics``; one-shot runs can dump it to ``METRICS_FILE``.
+"""
+
+import abc
+import asyncio
+import bisect
+import contextlib
+import logging
+import math
+import weakref
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from pathlib import Path
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RPC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+CHUNK_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+Sample = tuple[str, dict[str, str], float]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self.metrics:
+            msg = f"Metric {metric.name} is already registered"
+            raise ValueError(msg)
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(
+                f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+                for suffix, labels, value in metric.samples()
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str | Path) -> None:
+        """Write the rendered metrics atomically (for node_exporter textfiles)."""
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(self.render(), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+REGISTRY = Registry()
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ("attribute", "function", "tracked")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.function: Callable[[], float] | None = None
+        self.attribute = ""
+        self.tracked: list[weakref.ref] = []
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from ``function`` at render time."""
+        self.function = function
+
+    def track(self, obj: object, attribute: str) -> None:
+        """Read ``obj.<attribute>`` at render time without keeping ``obj`` alive.
+
+        The latest live object tracked under these labels is reported.
+        """
+        self.tracked = [ref for ref in self.tracked if ref() is not None]
+        self.tracked.append(weakref.ref(obj))
+        self.attribute = attribute
+
+    @property
+    def alive(self) -> bool:
+        """Whether an object tracked under these labels is still alive."""
+        return any(ref() is not None for ref in self.tracked)
+
+    def get(self) -> float:
+        if self.function:
+            return self.function()
+        for ref in reversed(self.tracked):
+            if (obj := ref()) is not None:
+                return getattr(obj, self.attribute)
+        return self.value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "count", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metric(abc.ABC):
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def labels(self, *values: str):  # noqa: ANN201
+        if len(values) != len(self.labelnames):
+            msg = f"{self.name} expects labels {self.labelnames}, got {values}"
+            raise ValueError(msg)
+        if (child := self._children.get(values)) is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterator[Sample]:
+        for values, child in self._children.items():
+            labels = dict(zip(self.labelnames, values, strict=True))
+            yield from self._child_samples(labels, child)
+
+    @abc.abstractmethod
+    def _new_child(self) -> object: ...
+
+    @abc.abstractmethod
+    def _child_samples(
+        self,
+        labels: dict[str, str],
+        child: object,
+    ) -> Iterator[Sample]: ...
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def _child_samples(
+        self,
+        labels: dict[str, str],
+        child: _CounterValue,
+    ) -> Iterator[Sample]:
+        yield "", labels, child.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def track_instance(self, obj: object, attribute: str, name: str) -> str:
+        """Track ``obj`` under its own ``name`` label and return that label.
+
+        ``name`` is suffixed (``name#2``, ...) while another live object holds
+        it, so instances sharing a name do not replace each other.
+        """
+        label, num = name, 1
+        while (child := self.labels(label)).alive:
+            num += 1
+            label = f"{name}#{num}"
+        child.track(obj, attribute)
+        return label
+
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def _child_samples(
+        self,
+        labels: dict[str, str],
+        child: _GaugeValue,
+    ) -> Iterator[Sample]:
+        yield "", labels, child.get()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry = REGISTRY,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def _child_samples(
+        self,
+        labels: dict[str, str],
+        child: _HistogramValue,
+    ) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts, strict=True):
+            cumulative += count
+            yield "_bucket", labels | {"le": _format_value(bound)}, cumulative
+        yield "_bucket", labels | {"le": "+Inf"}, child.count
+        yield "_sum", labels, child.sum
+        yield "_count", labels, child.count
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+@contextlib.asynccontextmanager
+async def file_dump(
+    path: str | Path = settings.METRICS_FILE,
+    interval: float = settings.METRICS_DUMP_INTERVAL,
+) -> AsyncIterator[None]:
+    """Rewrite ``path`` every ``interval`` seconds while the block runs.
+
+    Does nothing when ``path`` is empty (``METRICS_FILE`` unset). Missing
+    parent directories are created; failed writes are logged and retried at
+    the next interval.
+    """
+    if not path:
+        yield
+        return
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning("Cannot create the metrics directory for %s: %s", path, e)
+    task = asyncio.create_task(_dump_periodically(path, interval))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+async def _dump_periodically(path: str | Path, interval: float) -> None:
+    try:
+        while True:
+            _write_metrics(path)
+            await asyncio.sleep(interval)
+    finally:
+        if _write_metrics(path):
+            logger.debug("Metrics written to %s", path)
+
+
+def _write_metrics(path: str | Path) -> bool:
+    try:
+        REGISTRY.write(path)
+    except OSError as e:
+        logger.warning("Failed to write metrics to %s: %s", path, e)
+        return False
+    return True
+
+
+SUBSCRIPTIONS_FETCHED = Counter(
+    "vpn_subscriptions_fetched_total",
+    "Subscription fetches by result.",
+    ("result",),
+)
+SUBSCRIPTIONS_SKIPPED = Counter(
+    "vpn_subscriptions_skipped_total",
+    "Subscription fetches skipped by the quality policy, by reason.",
+    ("reason",),
+)
+LINKS_PARSED = Counter(
+    "vpn_links_parsed_total",
+    "Subscription links parsed into servers.",
+    ("protocol",),
+)
+LINK_PARSE_ERRORS = Counter(
+    "vpn_link_parse_errors_total",
+    "Subscription links that failed to parse.",
+    ("protocol",),
+)
+DUPLICATE_LINKS = Counter(
+    "vpn_duplicate_links_total",
+    "Links skipped before parsing because their server was already known.",
+)
+SERVERS_PROBED = Counter(
+    "vpn_servers_probed_total",
+    "Servers handed to a probe stage.",
+    ("stage",),
+)
+PROBES = Counter(
+    "vpn_probes_total",
+    "Probe operations (connects, handshakes, HTTP requests) by result.",
+    ("stage", "result"),
+)
+PROBE_LATENCY = Histogram(
+    "vpn_probe_latency_seconds",
+    "Measured time of successful probe operations.",
+    ("stage",),
+)
+HTTP_REQUESTS_SKIPPED = Counter(
+    "vpn_http_requests_skipped_total",
+    "HTTP probe requests not sent or cancelled by the URL policy, by reason.",
+    ("reason",),
+)
+HTTP_WARM_REQUESTS = Counter(
+    "vpn_http_warm_requests_total",
+    "Warm HTTP probe requests, by whether curl reused the cold connection.",
+    ("connection",),
+)
+XRAY_RPC_LATENCY = Histogram(
+    "vpn_xray_rpc_seconds",
+    "xray API call latency.",
+    ("method",),
+    buckets=RPC_BUCKETS,
+)
+HTTP_CHUNK_DURATION = Histogram(
+    "vpn_http_chunk_seconds",
+    "Duration of one HttpProber chunk, outbound setup and teardown included.",
+    buckets=CHUNK_BUCKETS,
+)
+PROBE_TIMEOUT = Gauge(
+    "vpn_probe_timeout_seconds",
+    "Current adaptive deadline of a probe phase.",
+    ("phase",),
+)
+LIMITER_IN_FLIGHT = Gauge(
+    "vpn_limiter_in_flight",
+    "Operations currently holding a concurrency slot.",
+    ("limiter",),
+)
+LIMITER_LIMIT = Gauge(
+    "vpn_limiter_limit",
+    "Current concurrency limit.",
+    ("limiter",),
+)
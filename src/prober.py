@@ -1,18 +1,46 @@
 import asyncio
+import contextlib
+import errno
+import heapq
 import logging
+import selectors
+import socket
+import ssl
+import statistics
+import struct
 import time
-from collections.abc import Coroutine, Generator, Iterable, Sequence
+from collections import deque
+from collections.abc import (
+    AsyncIterator,
+    Coroutine,
+    Generator,
+    Iterable,
+    Sequence,
+)
+from functools import cached_property
 from typing import TYPE_CHECKING, Any
 
-from curl_cffi import AsyncSession, CurlOpt
+from src import metrics, tracing
+from src.concurrency import (
+    LOCAL_ERRNOS,
+    AdaptiveLimiter,
+    AdaptiveTimeout,
+    is_local_error,
+)
 from src.config import settings
-from src.xray.handlers import XrayPoolHandler
+from src.instrumentation import ProbeStats
 
 if TYPE_CHECKING:
+    from curl_cffi import AsyncCurl, AsyncSession, Curl
     from server.server import Server
+    from src.xray.handlers import XrayPoolHandler
 
 logger = logging.getLogger(__name__)
 
+_LINGER_ABORT = struct.pack("ii", 1, 0)
+# Times a batch probe is re-queued after failing on this host (e.g. EMFILE)
+_LOCAL_FAILURE_RETRIES = 3
+
 
 class ConnectionProber:
     def __init__(
@@ -21,17 +49,44 @@ class ConnectionProber:
         max_concurrent: int = settings.CONNECTION_PROBER_MAX_CONCURRENT_CONNECTIONS,
     ) -> None:
         self.timeout = timeout
-        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._limiter = AdaptiveLimiter(
+            max_concurrent,
+            min_limit=settings.CONNECTION_PROBER_MIN_CONCURRENT_CONNECTIONS,
+            max_limit=settings.CONNECTION_PROBER_MAX_CONCURRENT_CONNECTIONS_LIMIT,
+            name="ConnectionProber",
+        )
+        self.deadline = AdaptiveTimeout(timeout, name="connection")
+        self.stats = ProbeStats("Connection", self._limiter.lag_monitor)
 
     async def probe(self, servers: Iterable["Server"]) -> None:
+        servers = list(servers)
+        metrics.SERVERS_PROBED.labels("connection").inc(len(servers))
+        self.stats.reset()
+        self._limiter.lag_monitor.ensure_started()
         tasks = [self._safe_connection_measure(server) for server in servers]
         await asyncio.gather(*tasks)
+        lagged = [
+            server
+            for server in servers
+            if server.response_time.connection_lag_flagged
+        ]
+        if settings.PROBE_REPROBE_LAGGED and lagged:
+            logger.info("Re-probing %d servers measured under loop lag.", len(lagged))
+            await asyncio.gather(
+                *[self._safe_connection_measure(server) for server in lagged],
+            )
+        self._limiter.lag_monitor.stop()
+        self.stats.log_summary()
 
     async def _safe_connection_measure(self, server: "Server") -> None:
         try:
-            conn_time = await self._get_connection_time(server.address, server.port)
+            conn_time, lag_flagged = await self._get_connection_time(
+                server.address,
+                server.port,
+            )
         except (asyncio.TimeoutError, OSError) as e:
             server.response_time.connection = settings.DONT_ALIVE_CONNECTION_TIME
+            server.response_time.connection_lag_flagged = False
             logger.debug(
                 "Server %s:%d connection FAILED: %s",
                 server.address,
@@ -40,6 +95,7 @@ class ConnectionProber:
             )
         else:
             server.response_time.connection = conn_time
+            server.response_time.connection_lag_flagged = lag_flagged
             logger.debug(
                 "Server %s:%d connection OK: %.3fs",
                 server.address,
@@ -51,16 +107,430 @@ class ConnectionProber:
         self,
         address: str,
         port: int,
+    ) -> tuple[float, bool]:
+        """Return the TCP connect time and whether it was taken under loop lag."""
+        queued_at = time.perf_counter()
+        async with self._limiter:
+            start_time = time.perf_counter()
+            try:
+                conn_time = await self._connect(address, port)
+            except (asyncio.TimeoutError, OSError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.deadline.record_timeout()
+                self._limiter.record(success=False, local_failure=is_local_error(e))
+                self.stats.record(
+                    queued_at,
+                    start_time,
+                    time.perf_counter() - start_time,
+                    success=False,
+                )
+                raise
+            self._limiter.record(success=True, rtt=conn_time)
+            self.deadline.record(conn_time)
+            timing = self.stats.record(queued_at, start_time, conn_time, success=True)
+            return round(conn_time, 3), timing.flagged
+
+    async def _connect(self, address: str, port: int) -> float:
+        """Open and close a TCP connection, return the time it took to open."""
+        start_time = time.perf_counter()
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port),
+            timeout=self.deadline.value,
+        )
+        conn_time = time.perf_counter() - start_time
+        writer.close()
+        await writer.wait_closed()
+        return conn_time
+
+
+class SocketConnectionProber(ConnectionProber):
+    """Connect prober on raw non-blocking sockets.
+
+    Skips the StreamReader/StreamWriter pair of ``open_connection``, resolves
+    the address before starting the timer and closes with ``SO_LINGER`` 0, so
+    the socket is reset immediately instead of lingering in TIME_WAIT. The
+    resolution still counts against the deadline.
+    """
+
+    async def _connect(self, address: str, port: int) -> float:
+        loop = asyncio.get_running_loop()
+        deadline = time.perf_counter() + self.deadline.value
+        family, sock_type, proto, _, sockaddr = (
+            await asyncio.wait_for(
+                loop.getaddrinfo(address, port, type=socket.SOCK_STREAM),
+                timeout=self.deadline.value,
+            )
+        )[0]
+        sock = socket.socket(family, sock_type, proto)
+        sock.setblocking(False)  # noqa: FBT003
+        try:
+            start_time = time.perf_counter()
+            await asyncio.wait_for(
+                loop.sock_connect(sock, sockaddr),
+                timeout=deadline - start_time,
+            )
+            return time.perf_counter() - start_time
+        finally:
+            _abort_socket(sock)
+
+
+class BatchConnectionProber(ConnectionProber):
+    """Connect prober that drives whole batches of sockets on one selector.
+
+    Addresses are resolved on the event loop, then every batch of
+    non-blocking connects is started at once and polled with a single
+    epoll/kqueue set in a worker thread. No coroutine, future or transport is
+    created per probe, and completion times come straight from the selector
+    wake-ups. Batches take their slots from the adaptive limiter, so its
+    limit (capped by ``batch_size``) sets the batch size.
+    """
+
+    def __init__(
+        self,
+        timeout: int = settings.CONNECTION_PROBER_TIMEOUT,
+        max_concurrent: int = settings.CONNECTION_PROBER_MAX_CONCURRENT_CONNECTIONS,
+        batch_size: int = settings.CONNECTION_PROBER_BATCH_SIZE,
+    ) -> None:
+        super().__init__(timeout, max_concurrent)
+        self.batch_size = batch_size
+
+    async def probe(self, servers: Iterable["Server"]) -> None:
+        servers = list(servers)
+        metrics.SERVERS_PROBED.labels("connection").inc(len(servers))
+        self.stats.reset()
+        self._limiter.lag_monitor.ensure_started()
+        targets = await self._resolve(servers)
+        await self._probe_targets(targets)
+        lagged = [
+            target
+            for target in targets
+            if target[0].response_time.connection_lag_flagged
+        ]
+        if settings.PROBE_REPROBE_LAGGED and lagged:
+            logger.info("Re-probing %d servers measured under loop lag.", len(lagged))
+            await self._probe_targets(lagged)
+        self._limiter.lag_monitor.stop()
+        self.stats.log_summary()
+
+    async def _resolve(self, servers: list["Server"]) -> list[tuple]:
+        loop = asyncio.get_running_loop()
+        resolved = await asyncio.gather(
+            *[
+                loop.getaddrinfo(server.address, server.port, type=socket.SOCK_STREAM)
+                for server in servers
+            ],
+            return_exceptions=True,
+        )
+        targets = []
+        for server, addr_info in zip(servers, resolved, strict=True):
+            if isinstance(addr_info, BaseException) or not addr_info:
+                server.response_time.connection = settings.DONT_ALIVE_CONNECTION_TIME
+                server.response_time.connection_lag_flagged = False
+                logger.debug("Server %s resolve FAILED: %s", server.address, addr_info)
+                continue
+            family, sock_type, proto, _, sockaddr = addr_info[0]
+            targets.append((server, family, sock_type, proto, sockaddr))
+        return targets
+
+    async def _probe_targets(self, targets: list[tuple]) -> None:
+        # (target, local failures so far, queued at)
+        queued_at = time.perf_counter()
+        pending = deque((target, 0, queued_at) for target in targets)
+        while pending:
+            batch = []
+            # Nothing else holds slots between batches, so the first one is free
+            while (
+                pending
+                and len(batch) < self.batch_size
+                and self._limiter.try_acquire()
+            ):
+                batch.append(pending.popleft())
+            started_at = time.perf_counter()
+            timeout = self.deadline.value
+            try:
+                results, local_failures, timed_out = await asyncio.to_thread(
+                    self._connect_batch,
+                    [target for target, *_ in batch],
+                    timeout,
+                )
+            finally:
+                for _ in batch:
+                    self._limiter.release()
+            for num, ((target, retries, queued_at), conn_time) in enumerate(
+                zip(batch, results, strict=True),
+            ):
+                server = target[0]
+                if num in local_failures:
+                    # Running out of sockets here says nothing about the server
+                    self._limiter.record(success=False, local_failure=True)
+                    if retries < _LOCAL_FAILURE_RETRIES:
+                        pending.append((target, retries + 1, queued_at))
+                    else:
+                        logger.warning(
+                            "Server %s:%d left unprobed: no local sockets.",
+                            server.address,
+                            server.port,
+                        )
+                elif conn_time is None:
+                    if num in timed_out:
+                        self.deadline.record_timeout()
+                    self._limiter.record(success=False)
+                    self.stats.record(queued_at, started_at, timeout, success=False)
+                    server.response_time.connection = (
+                        settings.DONT_ALIVE_CONNECTION_TIME
+                    )
+                    server.response_time.connection_lag_flagged = False
+                else:
+                    self._limiter.record(success=True, rtt=conn_time)
+                    self.deadline.record(conn_time)
+                    timing = self.stats.record(
+                        queued_at,
+                        started_at,
+                        conn_time,
+                        success=True,
+                    )
+                    server.response_time.connection = round(conn_time, 3)
+                    server.response_time.connection_lag_flagged = timing.flagged
+
+    def _connect_batch(
+        self,
+        batch: list[tuple],
+        timeout: float,
+    ) -> tuple[list[float | None], set[int], set[int]]:
+        """Return connect times (None if failed), local failures and timeouts."""
+        results: list[float | None] = [None] * len(batch)
+        local_failures: set[int] = set()
+        timed_out: set[int] = set()
+        started: dict[socket.socket, tuple[int, float]] = {}
+        with selectors.DefaultSelector() as selector:
+            for num, (_, family, sock_type, proto, sockaddr) in enumerate(batch):
+                try:
+                    sock = socket.socket(family, sock_type, proto)
+                except OSError as e:
+                    logger.debug("Socket creation FAILED: %s", e)
+                    local_failures.add(num)
+                    continue
+                sock.setblocking(False)  # noqa: FBT003
+                start_time = time.perf_counter()
+                err = sock.connect_ex(sockaddr)
+                if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    if err in LOCAL_ERRNOS:
+                        local_failures.add(num)
+                    _abort_socket(sock)
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                started[sock] = (num, start_time)
+
+            deadline = time.perf_counter() + timeout
+            while started and (remaining := deadline - time.perf_counter()) > 0:
+                events = selector.select(remaining)
+                finished_at = time.perf_counter()
+                for key, _ in events:
+                    sock = key.fileobj
+                    num, start_time = started.pop(sock)
+                    selector.unregister(sock)
+                    err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if not err:
+                        results[num] = finished_at - start_time
+                    elif err in LOCAL_ERRNOS:
+                        local_failures.add(num)
+                    _abort_socket(sock)
+            for sock, (num, _) in started.items():
+                timed_out.add(num)
+                selector.unregister(sock)
+                _abort_socket(sock)
+        return results, local_failures, timed_out
+
+
+CONNECTION_PROBERS: dict[str, type[ConnectionProber]] = {
+    "stream": ConnectionProber,
+    "socket": SocketConnectionProber,
+    "batch": BatchConnectionProber,
+}
+
+
+def _abort_socket(sock: socket.socket) -> None:
+    """Close with an immediate RST instead of a FIN/TIME_WAIT sequence."""
+    with contextlib.suppress(OSError):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_ABORT)
+    sock.close()
+
+
+def tls_target(server: "Server") -> tuple[str, tuple[str, ...]] | None:
+    """Return ``(sni, alpn)`` for servers that speak TLS/REALITY, else None."""
+    params = server.params
+    # Case-insensitive, as in the xray outbound builders
+    if server.protocol == "vmess":
+        if getattr(params, "tls", "").lower() != "tls":
+            return None
+    elif getattr(params, "security", "").lower() not in ("tls", "reality"):
+        return None
+    sni = getattr(params, "sni", "") or getattr(params, "host", "") or server.address
+    alpn = tuple(
+        protocol
+        for value in getattr(params, "alpn", None) or ()
+        for protocol in value.split(",")
+        if protocol
+    )
+    return sni, alpn
+
+
+class TlsProber:
+    """Measures the TLS handshake time straight to the server, without xray.
+
+    The ClientHello carries the server's ``sni`` (and ``alpn``), so REALITY
+    servers answer with the certificate of the site they mimic. Certificates
+    are not verified: only whether and how fast the handshake completes
+    matters. Servers without TLS are left untouched.
+    """
+
+    def __init__(
+        self,
+        timeout: int = settings.TLS_PROBER_TIMEOUT,
+        max_concurrent: int = settings.TLS_PROBER_MAX_CONCURRENT_HANDSHAKES,
+    ) -> None:
+        self.timeout = timeout
+        self._limiter = AdaptiveLimiter(
+            max_concurrent,
+            min_limit=settings.TLS_PROBER_MIN_CONCURRENT_HANDSHAKES,
+            max_limit=settings.TLS_PROBER_MAX_CONCURRENT_HANDSHAKES_LIMIT,
+            name="TlsProber",
+        )
+        self.connect_deadline = AdaptiveTimeout(timeout, name="tls.connect")
+        self.handshake_deadline = AdaptiveTimeout(timeout, name="tls.handshake")
+        self.stats = ProbeStats("TLS", self._limiter.lag_monitor)
+        self._contexts: dict[tuple[str, ...], ssl.SSLContext] = {}
+
+    async def probe(self, servers: Iterable["Server"]) -> None:
+        self.stats.reset()
+        self._limiter.lag_monitor.ensure_started()
+        tasks = [
+            self._safe_handshake_measure(server, target)
+            for server in servers
+            if (target := tls_target(server))
+        ]
+        metrics.SERVERS_PROBED.labels("tls").inc(len(tasks))
+        await asyncio.gather(*tasks)
+        self._limiter.lag_monitor.stop()
+        self.stats.log_summary()
+
+    async def _safe_handshake_measure(
+        self,
+        server: "Server",
+        target: tuple[str, tuple[str, ...]],
+    ) -> None:
+        sni, alpn = target
+        try:
+            tls_time = await self._get_handshake_time(
+                server.address,
+                server.port,
+                sni,
+                alpn,
+            )
+        except (asyncio.TimeoutError, OSError) as e:
+            server.response_time.tls = settings.DONT_ALIVE_CONNECTION_TIME
+            logger.debug(
+                "Server %s:%d TLS handshake (sni=%s) FAILED: %s",
+                server.address,
+                server.port,
+                sni,
+                e,
+            )
+        else:
+            server.response_time.tls = tls_time
+            logger.debug(
+                "Server %s:%d TLS handshake OK: %.3fs",
+                server.address,
+                server.port,
+                tls_time,
+            )
+
+    async def _get_handshake_time(
+        self,
+        address: str,
+        port: int,
+        sni: str,
+        alpn: tuple[str, ...],
     ) -> float:
-        async with self._semaphore:
+        """Return the TLS handshake time, TCP connect excluded."""
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        async with self._limiter:
+            started_at = time.perf_counter()
+            sock = None
+            try:
+                sock = await self._open_socket(address, port)
+                start_time = time.perf_counter()
+                transport, _ = await asyncio.wait_for(
+                    loop.create_connection(
+                        asyncio.Protocol,
+                        sock=sock,
+                        ssl=self._ssl_context(alpn),
+                        server_hostname=sni,
+                        ssl_handshake_timeout=self.handshake_deadline.value,
+                    ),
+                    timeout=self.handshake_deadline.value,
+                )
+            except (asyncio.TimeoutError, OSError) as e:
+                if sock is not None and isinstance(e, asyncio.TimeoutError):
+                    self.handshake_deadline.record_timeout()
+                self._limiter.record(success=False, local_failure=is_local_error(e))
+                self.stats.record(
+                    queued_at,
+                    started_at,
+                    time.perf_counter() - started_at,
+                    success=False,
+                )
+                raise
+            tls_time = time.perf_counter() - start_time
+            transport.abort()
+            self._limiter.record(success=True, rtt=tls_time)
+            self.handshake_deadline.record(tls_time)
+            self.stats.record(queued_at, started_at, tls_time, success=True)
+            return round(tls_time, 3)
+
+    async def _open_socket(self, address: str, port: int) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        # Resolution counts against the connect deadline, not the timer
+        deadline = time.perf_counter() + self.connect_deadline.value
+        try:
+            family, sock_type, proto, _, sockaddr = (
+                await asyncio.wait_for(
+                    loop.getaddrinfo(address, port, type=socket.SOCK_STREAM),
+                    timeout=self.connect_deadline.value,
+                )
+            )[0]
+        except asyncio.TimeoutError:
+            self.connect_deadline.record_timeout()
+            raise
+        sock = socket.socket(family, sock_type, proto)
+        sock.setblocking(False)  # noqa: FBT003
+        try:
             start_time = time.perf_counter()
-            _, writer = await asyncio.wait_for(
-                asyncio.open_connection(address, port),
-                timeout=self.timeout,
+            await asyncio.wait_for(
+                loop.sock_connect(sock, sockaddr),
+                timeout=deadline - start_time,
             )
-            writer.close()
-            await writer.wait_closed()
-            return round(time.perf_counter() - start_time, 3)
+        except BaseException as e:
+            _abort_socket(sock)
+            if isinstance(e, asyncio.TimeoutError):
+                self.connect_deadline.record_timeout()
+            raise
+        self.connect_deadline.record(time.perf_counter() - start_time)
+        return sock
+
+    def _ssl_context(self, alpn: tuple[str, ...]) -> ssl.SSLContext:
+        if (context := self._contexts.get(alpn)) is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            if alpn:
+                context.set_alpn_protocols(list(alpn))
+            self._contexts[alpn] = context
+        return context
+
+
+HTTP_URL_POLICIES = ("parallel", "sequential", "hedged")
 
 
 class HttpProber:
@@ -69,83 +539,346 @@ class HttpProber:
         timeout: int = settings.PROXYPROBER_TIMEOUT,
         concurent_connections: int = settings.HTTP_PROBER_MAX_CONCURRENT_REQUESTS,
         urls: Sequence[str] = settings.HTTP_REAL_SITES,
+        url_policy: str = settings.HTTP_PROBER_URL_POLICY,
+        hedge_delay: float = settings.HTTP_PROBER_HEDGE_DELAY,
+        cutoff_top_k: int = settings.HTTP_PROBER_CUTOFF_TOP_K,
+        warm_requests: int = settings.HTTP_PROBER_WARM_REQUESTS,
+        pool_size: int = settings.XRAY_POOL_SIZE,
     ) -> None:
+        if url_policy not in HTTP_URL_POLICIES:
+            msg = f"Unknown URL policy {url_policy!r}, expected {HTTP_URL_POLICIES}"
+            raise ValueError(msg)
         self.timeout = timeout
+        # Through the SOCKS inbound: proxy handshake, the tunnelled connect and
+        # the target's TLS handshake; then the whole request
+        self.connect_deadline = AdaptiveTimeout(timeout, name="http.connect")
+        self.total_deadline = AdaptiveTimeout(timeout, name="http.total")
         self.urls = urls
-        self._semaphore = asyncio.Semaphore(concurent_connections)
-        self.pool_manager = XrayPoolHandler(
+        self.url_policy = url_policy
+        self.hedge_delay = hedge_delay
+        self.cutoff_top_k = cutoff_top_k
+        self.warm_requests = warm_requests
+        self.pool_size = pool_size
+        # Negated totals of the fastest fully measured servers (a max-heap of
+        # at most cutoff_top_k), reset on every probe() call
+        self._best_totals: list[float] = []
+        self._limiter = AdaptiveLimiter(
+            concurent_connections,
+            min_limit=settings.HTTP_PROBER_MIN_CONCURRENT_REQUESTS,
+            max_limit=settings.HTTP_PROBER_MAX_CONCURRENT_REQUESTS_LIMIT,
+            name="HttpProber",
+        )
+        self.stats = ProbeStats("HTTP", self._limiter.lag_monitor)
+
+    # xray (grpc + protobuf stubs) and curl_cffi are only imported once the HTTP
+    # stage actually runs, so subscription-only and TCP-only runs start faster.
+    @cached_property
+    def pool_manager(self) -> "XrayPoolHandler":
+        from src.xray.handlers import XrayPoolHandler  # noqa: PLC0415
+
+        return XrayPoolHandler(
             api_url=settings.XRAY_API_URL,
             start_port=settings.XRAY_START_INBOUND_PORT,
-            pool_size=settings.XRAY_POOL_SIZE,
+            pool_size=self.pool_size,
         )
-        self.session = self.setup_session()
+
+    @cached_property
+    def session(self) -> "AsyncSession":
+        return self.setup_session(reuse=bool(self.warm_requests))
 
     def setup_session(
         self,
-        timeout: int = settings.PROXYPROBER_TIMEOUT,
         headers: dict[str, str] | None = None,
         *,
         connect_only: bool = False,
-    ) -> AsyncSession:
+        reuse: bool = False,
+    ) -> "AsyncSession":
+        """Create the curl session.
+
+        With ``reuse`` connections are kept alive, so the requests after the
+        first one through a proxy to a host skip the SOCKS handshake, the
+        outbound session and the target's TLS handshake.
+        """
+        from curl_cffi import AsyncSession, CurlInfo, CurlOpt  # noqa: PLC0415
+
         if headers is None:
-            headers = {"Connection": "close"}
+            headers = {} if reuse else {"Connection": "close"}
         curl_options = {
-            CurlOpt.FORBID_REUSE: 1,  # Запрещает повторное использование соединения
-            CurlOpt.FRESH_CONNECT: 1,  # Всегда создаёт новое TCP-соединение
             CurlOpt.CONNECT_ONLY: int(connect_only),  # 1=только соединение без запроса
-            CurlOpt.TIMEOUT: timeout,  # Общий таймаут всего запроса (сек)
-            #  CurlOpt.SERVER_RESPONSE_TIMEOUT: 5, # Время ожидания ответа от сервера(сек)
-            #  CurlOpt.CONNECTTIMEOUT: 3, # Таймаут установки TCP-соединения (сек)
+            # Таймауты соединения и всего запроса задаются в _fetch для каждого
+            # запроса: session curl_options перекрыли бы их
         }
-        return AsyncSession(curl_options=curl_options, headers=headers)
+        if not reuse:
+            # Запрещает повторное использование соединения
+            curl_options[CurlOpt.FORBID_REUSE] = 1
+            # Всегда создаёт новое TCP-соединение
+            curl_options[CurlOpt.FRESH_CONNECT] = 1
+        # TLS done (https) or connected (http), for the connect deadline
+        self._connect_infos = (CurlInfo.APPCONNECT_TIME, CurlInfo.CONNECT_TIME)
+        return AsyncSession(
+            # Every limiter slot runs one transfer; the default of 10 easy
+            # handles would queue the rest inside curl_cffi
+            max_clients=max(self._limiter.limit, self._limiter.max_limit),
+            curl_options=curl_options,
+            headers=headers,
+            curl_infos=[*self._connect_infos, CurlInfo.NUM_CONNECTS],
+        )
 
     async def _close_session(self) -> None:
         await self.session.close()
+        del self.session
 
-    async def probe(self, servers: Iterable["Server"]) -> None:
-        for servers_chunk in self._chunk_servers(servers, settings.XRAY_POOL_SIZE):
-            with self.pool_manager.outbound_pool(servers_chunk):
-                tasks = self._create_tasks(servers_chunk)
-                await asyncio.gather(*tasks, return_exceptions=True)
+    async def probe(
+        self,
+        servers: Iterable["Server"],
+        *,
+        keep_alive: bool = False,
+        urls: Sequence[str] | None = None,
+        stop_after: int = 0,
+    ) -> None:
+        """Probe servers through xray.
 
+        With ``keep_alive`` the session and the xray process stay up for the
+        next call; the caller is then responsible for calling :meth:`close`.
+        ``urls`` overrides :attr:`urls` for this call. With ``stop_after``
+        the remaining chunks are skipped once that many servers are alive;
+        skipped servers keep an empty ``response_time.http``.
+        """
+        async with self.sweep():
+            await self.probe_chunks(servers, urls or self.urls, stop_after=stop_after)
+        if not keep_alive:
+            await self.close()
+
+    @contextlib.asynccontextmanager
+    async def sweep(self) -> AsyncIterator[None]:
+        """Treat the :meth:`probe_chunks` calls inside as one sweep.
+
+        Resets the stats and the cutoff, keeps the loop lag monitor running
+        and logs the stats summary once at the end.
+        """
+        self.stats.reset()
+        self._best_totals = []
+        self._limiter.lag_monitor.ensure_started()
+        try:
+            yield
+        finally:
+            self._limiter.lag_monitor.stop()
+            self.stats.log_summary()
+
+    async def probe_chunks(
+        self,
+        servers: Iterable["Server"],
+        urls: Sequence[str],
+        *,
+        stop_after: int = 0,
+    ) -> None:
+        """Probe ``servers`` on ``urls`` chunk by chunk, see :meth:`probe`.
+
+        The session and the xray process stay up; call within :meth:`sweep`.
+        """
+        alive_count = 0
+        for servers_chunk in self._chunk_servers(servers, self.pool_size):
+            metrics.SERVERS_PROBED.labels("http").inc(len(servers_chunk))
+            chunk_start = time.perf_counter()
+            with (
+                tracing.span("http_chunk", {"servers": len(servers_chunk)}) as span,
+                self.pool_manager.outbound_pool(servers_chunk),
+            ):
+                for server in servers_chunk:
+                    # Set again by any of this probe's URLs sampled under lag
+                    server.response_time.http_lag_flagged = False
+                    server.response_time.http_estimated.clear()
+                await self._probe_chunk(servers_chunk, urls)
+                if self.warm_requests and "session" in self.__dict__:
+                    # The inbound ports get other servers' outbounds in the
+                    # next chunk, kept-alive connections must not outlive them
+                    await self._close_session()
+                chunk_alive = sum(
+                    sum(server.response_time.http.values())
+                    < settings.DONT_ALIVE_CONNECTION_TIME
+                    for server in servers_chunk
+                )
+                span.set_attribute("servers.alive", chunk_alive)
+            metrics.HTTP_CHUNK_DURATION.observe(time.perf_counter() - chunk_start)
             logger.debug("Chunk check completed")
-        await self._close_session()
-        self.pool_manager.process_manager.stop()
+            alive_count += chunk_alive
+            if stop_after and alive_count >= stop_after:
+                logger.info(
+                    "%d servers alive, skipping the remaining HTTP probes.",
+                    alive_count,
+                )
+                break
+
+    async def close(self) -> None:
+        if "session" in self.__dict__:
+            await self._close_session()
+        if "pool_manager" in self.__dict__:
+            self.pool_manager.process_manager.stop()
+
+    async def _probe_chunk(
+        self,
+        servers: Sequence["Server"],
+        urls: Sequence[str],
+    ) -> None:
+        """Probe one chunk; ``servers[num]`` is behind the ``num``-th inbound."""
+        tasks = self._create_tasks(servers, urls)
+        await asyncio.gather(*tasks, return_exceptions=True)
 
     def _create_tasks(
         self,
         servers: Iterable["Server"],
+        urls: Sequence[str],
     ) -> list[Coroutine]:
         tasks = []
         for num, server in enumerate(servers):
-            proxy_url = f"socks5h://127.0.0.1:{settings.XRAY_START_INBOUND_PORT + num}"
+            proxy_url = _inbound_proxy(num)
             logger.debug(
                 "Using proxy %s for server %s, [%s]",
                 proxy_url,
                 server.address,
                 num,
             )
-            tasks.extend(
-                [self._fetch(server, proxy_url, url) for url in self.urls],
-            )
+            if self.url_policy == "parallel" or len(urls) == 1:
+                tasks.extend(
+                    [self._fetch(server, proxy_url, url) for url in urls],
+                )
+            else:
+                tasks.append(self._probe_urls(server, proxy_url, urls))
         return tasks
 
+    async def _probe_urls(
+        self,
+        server: "Server",
+        proxy: str,
+        urls: Sequence[str],
+    ) -> None:
+        """Probe ``urls`` sequentially or hedged, stopping as early as possible.
+
+        A failed URL makes the server dead, so the remaining ones are not
+        sent. Once the measured time alone exceeds the cutoff, the remaining
+        URLs get the mean measured time in ``http_estimated``: the ranking
+        total stays above the cutoff, so the server ranks below the top k.
+        """
+        http = server.response_time.http
+        delay = self.hedge_delay if self.url_policy == "hedged" else None
+        queued = list(urls)
+        running: dict[asyncio.Task, str] = {}
+        finished: list[str] = []
+        stop_reason = ""
+        try:
+            while (queued or running) and not stop_reason:
+                if queued:
+                    url = queued.pop(0)
+                    task = asyncio.create_task(self._fetch(server, proxy, url))
+                    running[task] = url
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=delay if queued else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                finished.extend(running.pop(task) for task in done)
+                measured = [http[url] for url in finished]
+                if max(measured, default=0.0) >= settings.DONT_ALIVE_CONNECTION_TIME:
+                    stop_reason = "failure"
+                elif sum(measured) > self._cutoff():
+                    stop_reason = "cutoff"
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        if stop_reason:
+            skipped = [*running.values(), *queued]
+            if stop_reason == "cutoff":
+                estimate = sum(measured) / len(measured)
+                for url in skipped:
+                    server.response_time.http_estimated[url] = estimate
+            metrics.HTTP_REQUESTS_SKIPPED.labels(stop_reason).inc(len(skipped))
+        else:
+            self._add_total(sum(http[url] for url in urls))
+
+    def _record_timeout(self, error: BaseException) -> None:
+        """Charge a curl timeout to the deadline that cut the request off."""
+        from curl_cffi import CurlECode  # noqa: PLC0415
+
+        if getattr(error, "code", None) != CurlECode.OPERATION_TIMEDOUT:
+            return
+        # libcurl names the phase: "Connection timed out" until connected
+        # (SOCKS and TLS handshakes included), "Operation timed out" after
+        if "Operation timed out" in str(error):
+            self.total_deadline.record_timeout()
+        else:
+            self.connect_deadline.record_timeout()
+
+    def _cutoff(self) -> float:
+        if not self.cutoff_top_k or len(self._best_totals) < self.cutoff_top_k:
+            return float("inf")
+        return -self._best_totals[0]
+
+    def _add_total(self, total: float) -> None:
+        if not self.cutoff_top_k:
+            return
+        if len(self._best_totals) < self.cutoff_top_k:
+            heapq.heappush(self._best_totals, -total)
+        elif total < -self._best_totals[0]:
+            heapq.heapreplace(self._best_totals, -total)
+
     async def _fetch(
         self,
         server: "Server",
         proxy: str,
         url: str,
     ) -> None:
+        queued_at = time.perf_counter()
         try:
-            async with self._semaphore:
-                resp = await self.session.get(
-                    url,
-                    proxy=proxy,
-                    timeout=settings.PROXYPROBER_TIMEOUT,
+            async with self._limiter:
+                start_time = time.perf_counter()
+                connect_timeout = self.connect_deadline.value
+                total_timeout = max(self.total_deadline.value, connect_timeout)
+                try:
+                    resp = await self.session.get(
+                        url,
+                        proxy=proxy,
+                        # (connect, read): curl's total timeout is their sum
+                        timeout=(connect_timeout, total_timeout - connect_timeout),
+                    )
+                except Exception as e:
+                    self._record_timeout(e)
+                    self._limiter.record(success=False)
+                    self.stats.record(
+                        queued_at,
+                        start_time,
+                        time.perf_counter() - start_time,
+                        success=False,
+                    )
+                    raise
+                self._limiter.record(success=True, rtt=resp.elapsed)
+                timing = self.stats.record(
+                    queued_at,
+                    start_time,
+                    resp.elapsed,
+                    success=True,
+                )
+                warm = (
+                    # In the same slot: libcurl keeps only 4 idle connections
+                    # per running transfer, so a warm request queued behind
+                    # other servers' would mostly find its connection closed
+                    await self._fetch_warm(proxy, url)
+                    if self.warm_requests and 200 <= resp.status_code < 500
+                    else []
                 )
             if not (200 <= resp.status_code < 500):
                 raise ValueError(f"Bad status {resp.status_code}")
+            self.total_deadline.record(resp.elapsed)
+            if connect_time := next(
+                filter(None, map(resp.infos.get, self._connect_infos)),
+                None,
+            ):
+                self.connect_deadline.record(connect_time)
             server.response_time.http[url] = resp.elapsed
+            if warm:
+                server.response_time.http_warm[url] = statistics.fmean(warm)
+            server.response_time.http_lag_flagged |= timing.flagged
             logger.debug(
                 "%s → %s | %s | %s",
                 proxy,
@@ -157,6 +890,36 @@ class HttpProber:
             server.response_time.http[url] = settings.DONT_ALIVE_CONNECTION_TIME
             logger.debug("%s → %s | error: %s", proxy, url, e)
 
+    async def _fetch_warm(self, proxy: str, url: str) -> list[float]:
+        """Repeat ``url`` over the connection the cold request left open.
+
+        Warm latencies are steady-state request times, so they feed neither
+        the limiter nor the deadlines, which are sized for cold requests. A
+        failed warm request does not make the server dead.
+        """
+        from curl_cffi import CurlInfo  # noqa: PLC0415
+
+        latencies = []
+        for _ in range(self.warm_requests):
+            connect_timeout = self.connect_deadline.value
+            total_timeout = max(self.total_deadline.value, connect_timeout)
+            try:
+                resp = await self.session.get(
+                    url,
+                    proxy=proxy,
+                    timeout=(connect_timeout, total_timeout - connect_timeout),
+                )
+            except Exception as e:  # noqa: BLE001
+                logger.debug("%s → %s | warm error: %s", proxy, url, e)
+                break
+            if not (200 <= resp.status_code < 500):
+                break
+            metrics.HTTP_WARM_REQUESTS.labels(
+                "new" if resp.infos.get(CurlInfo.NUM_CONNECTS) else "reused",
+            ).inc()
+            latencies.append(resp.elapsed)
+        return latencies
+
     def _chunk_servers(
         self,
         servers: Iterable["Server"],
@@ -171,3 +934,164 @@ class HttpProber:
                 chunk = []
         if chunk:
             yield chunk
+
+
+class MultiHttpProber(HttpProber):
+    """Drives every request of a chunk from one curl multi handle.
+
+    Instead of a ``session.get`` coroutine per request, the chunk's requests
+    are easy handles added straight to curl_cffi's ``AsyncCurl`` (a multi
+    handle on the event loop): libcurl runs the transfers and Python only
+    wakes up when one finishes, to read its timings and start the next.
+    ``AdaptiveLimiter`` still bounds the number of running transfers. All
+    URLs of a server are sent at once (other URL policies fall back to
+    ``parallel``), and cutoff and warm requests are not supported.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+        super().__init__(*args, **kwargs)
+        if self.warm_requests:
+            msg = "The multi engine does not support HTTP_PROBER_WARM_REQUESTS"
+            raise ValueError(msg)
+        if self.url_policy != "parallel":
+            logger.warning(
+                "The multi engine sends a server's URLs in parallel, "
+                "ignoring HTTP_PROBER_URL_POLICY=%r.",
+                self.url_policy,
+            )
+            self.url_policy = "parallel"
+        if self.cutoff_top_k:
+            msg = "The multi engine does not support HTTP_PROBER_CUTOFF_TOP_K"
+            raise ValueError(msg)
+        # Easy handles are reset and reused across requests and chunks
+        self._handles: list["Curl"] = []
+
+    @cached_property
+    def multi(self) -> "AsyncCurl":
+        from curl_cffi import AsyncCurl  # noqa: PLC0415
+
+        return AsyncCurl()
+
+    async def close(self) -> None:
+        if "multi" in self.__dict__:
+            await self.multi.close()
+            del self.multi
+        for curl in self._handles:
+            curl.close()
+        self._handles.clear()
+        await super().close()
+
+    async def _probe_chunk(
+        self,
+        servers: Sequence["Server"],
+        urls: Sequence[str],
+    ) -> None:
+        from curl_cffi import Curl  # noqa: PLC0415
+
+        queued_at = time.perf_counter()
+        requests = deque(
+            (server, _inbound_proxy(num), url)
+            for num, server in enumerate(servers)
+            for url in urls
+        )
+        running: dict[asyncio.Future, tuple["Curl", "Server", str, str, float]] = {}
+        try:
+            while requests or running:
+                while requests and self._limiter.try_acquire():
+                    server, proxy, url = requests.popleft()
+                    curl = self._handles.pop() if self._handles else Curl()
+                    self._setup_handle(curl, proxy, url)
+                    future = self.multi.add_handle(curl)
+                    running[future] = (curl, server, proxy, url, time.perf_counter())
+                done, _ = await asyncio.wait(
+                    running,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for future in done:
+                    curl, server, proxy, url, start_time = running.pop(future)
+                    self._limiter.release()
+                    self._complete(
+                        curl,
+                        future,
+                        server,
+                        proxy,
+                        url,
+                        queued_at,
+                        start_time,
+                    )
+                    curl.reset()
+                    self._handles.append(curl)
+        finally:
+            for curl, *_ in running.values():
+                self.multi.remove_handle(curl)
+                self._limiter.release()
+                curl.close()
+
+    def _setup_handle(self, curl: "Curl", proxy: str, url: str) -> None:
+        from curl_cffi import CurlOpt  # noqa: PLC0415
+
+        connect_timeout = self.connect_deadline.value
+        total_timeout = max(self.total_deadline.value, connect_timeout)
+        curl.setopt(CurlOpt.URL, url)
+        curl.setopt(CurlOpt.PROXY, proxy)
+        curl.setopt(CurlOpt.CONNECTTIMEOUT_MS, int(connect_timeout * 1000))
+        curl.setopt(CurlOpt.TIMEOUT_MS, int(total_timeout * 1000))
+        curl.setopt(CurlOpt.FORBID_REUSE, 1)
+        curl.setopt(CurlOpt.FRESH_CONNECT, 1)
+        curl.setopt(CurlOpt.NOSIGNAL, 1)
+        curl.setopt(CurlOpt.WRITEFUNCTION, _discard)
+
+    def _complete(  # noqa: PLR0913
+        self,
+        curl: "Curl",
+        future: asyncio.Future,
+        server: "Server",
+        proxy: str,
+        url: str,
+        queued_at: float,
+        start_time: float,
+    ) -> None:
+        from curl_cffi import CurlInfo  # noqa: PLC0415
+
+        if error := future.exception():
+            self._record_timeout(error)
+            self._limiter.record(success=False)
+            self.stats.record(
+                queued_at,
+                start_time,
+                time.perf_counter() - start_time,
+                success=False,
+            )
+            server.response_time.http[url] = settings.DONT_ALIVE_CONNECTION_TIME
+            logger.debug("%s → %s | error: %s", proxy, url, error)
+            return
+        elapsed = curl.getinfo(CurlInfo.TOTAL_TIME)
+        status_code = curl.getinfo(CurlInfo.RESPONSE_CODE)
+        self._limiter.record(success=True, rtt=elapsed)
+        timing = self.stats.record(queued_at, start_time, elapsed, success=True)
+        if not (200 <= status_code < 500):
+            server.response_time.http[url] = settings.DONT_ALIVE_CONNECTION_TIME
+            logger.debug("%s → %s | error: Bad status %s", proxy, url, status_code)
+            return
+        self.total_deadline.record(elapsed)
+        if connect_time := curl.getinfo(CurlInfo.APPCONNECT_TIME) or curl.getinfo(
+            CurlInfo.CONNECT_TIME,
+        ):
+            self.connect_deadline.record(connect_time)
+        server.response_time.http[url] = elapsed
+        server.response_time.http_lag_flagged |= timing.flagged
+        logger.debug("%s → %s | %s | %s", proxy, url, status_code, elapsed)
+
+
+HTTP_PROBERS: dict[str, type[HttpProber]] = {
+    "session": HttpProber,
+    "multi": MultiHttpProber,
+}
+
+
+def _inbound_proxy(num: int) -> str:
+    return f"socks5h://127.0.0.1:{settings.XRAY_START_INBOUND_PORT + num}"
+
+
+def _discard(data: bytes) -> int:
+    return len(data)
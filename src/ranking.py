@@ -0,0 +1,214 @@
+"""Top-k server selection as best-arm identification under a probe budget.
+
+Every server is an arm and every HTTP request through it a noisy latency
+sample. Instead of probing all servers equally, :class:`BanditRanker` spends
+its budget LUCB-style on the servers whose confidence interval still
+straddles the boundary between the k fastest and the rest, and reports how
+confident it is that the returned top-k is the true one up to ``epsilon``
+(an (epsilon, delta)-PAC top-k).
+"""
+
+import contextlib
+import logging
+import math
+from collections.abc import Generator, Iterable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from src import tracing
+from src.config import settings
+
+if TYPE_CHECKING:
+    from src.prober import HttpProber
+    from src.server.schema import Server
+
+logger = logging.getLogger(__name__)
+
+# Responses dicts a probe round writes to
+_HTTP_RESULTS = ("http", "http_estimated", "http_warm")
+
+
+@dataclass(slots=True)
+class Arm:
+    server: "Server"
+    samples: int = 0
+    total: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.samples if self.samples else math.inf
+
+    def add(self, latency: float) -> None:
+        self.samples += 1
+        self.total += latency
+
+
+@dataclass(slots=True)
+class TopK:
+    servers: list["Server"]
+    # Lower bound on the probability that ``servers`` are the k fastest
+    confidence: float
+    probes: int
+
+
+class BanditRanker:
+    def __init__(
+        self,
+        prober: "HttpProber",
+        *,
+        k: int = settings.BANDIT_TOP_K,
+        budget: int = settings.BANDIT_PROBE_BUDGET,
+        delta: float = settings.BANDIT_DELTA,
+        epsilon: float = settings.BANDIT_EPSILON,
+        sigma: float = settings.BANDIT_LATENCY_SIGMA,
+        batch_size: int = settings.XRAY_POOL_SIZE,
+        urls: Sequence[str] = settings.HTTP_REAL_SITES,
+    ) -> None:
+        self.prober = prober
+        self.k = k
+        self.budget = budget
+        self.delta = delta
+        self.epsilon = epsilon
+        self.sigma = sigma
+        self.batch_size = batch_size
+        self.urls = urls
+
+    @tracing.traced()
+    async def rank(self, servers: Iterable["Server"]) -> TopK:
+        """Return the top-k servers by mean HTTP latency.
+
+        Latencies already in ``response_time.http`` count as samples, so the
+        ranker can refine the result of a regular HTTP sweep. Extra samples
+        stay in the arms; the servers' measurements are left as they were.
+        """
+        arms = [self._seed(server) for server in servers]
+        probes = rounds = 0
+        try:
+            async with self.prober.sweep():
+                while probes < self.budget and len(arms) > self.k:
+                    rounds += 1
+                    batch = self._ambiguous(arms, rounds)[: self.budget - probes]
+                    if not batch:
+                        break
+                    url = self.urls[rounds % len(self.urls)]
+                    servers = [arm.server for arm in batch]
+                    with _measurements_kept(servers):
+                        await self.prober.probe_chunks(servers, (url,))
+                        for arm in batch:
+                            arm.add(self._latency(arm.server.response_time.http[url]))
+                    probes += len(batch)
+        finally:
+            await self.prober.close()
+
+        arms.sort(key=lambda arm: arm.mean)
+        result = TopK(
+            servers=[arm.server for arm in arms[: self.k]],
+            confidence=self._confidence(arms),
+            probes=probes,
+        )
+        tracing.current_span().set_attributes(
+            {
+                "servers": len(arms),
+                "rounds": rounds,
+                "probes": probes,
+                "confidence": result.confidence,
+            },
+        )
+        logger.info(
+            "Top %d of %d servers after %d extra probes in %d rounds "
+            "(confidence %.3f).",
+            len(result.servers),
+            len(arms),
+            probes,
+            rounds,
+            result.confidence,
+        )
+        return result
+
+    def _seed(self, server: "Server") -> Arm:
+        arm = Arm(server)
+        for latency in server.response_time.http.values():
+            arm.add(self._latency(latency))
+        return arm
+
+    def _latency(self, latency: float) -> float:
+        # A failed request costs a full timeout rather than the 999 sentinel,
+        # so one failure does not outweigh any number of successes.
+        return min(latency, self.prober.timeout)
+
+    def _radius(self, arm: Arm, arms: int, rounds: int) -> float:
+        if not arm.samples:
+            return math.inf
+        # LUCB1 exploration rate: the intervals of all arms hold in every
+        # round with probability at least 1 - delta.
+        beta = math.log(5 * arms * rounds**4 / (4 * self.delta))
+        return self.sigma * math.sqrt(2 * beta / arm.samples)
+
+    def _ambiguous(self, arms: list[Arm], rounds: int) -> list[Arm]:
+        """Arms whose interval crosses the top-k boundary, widest overlap first.
+
+        Arms without a sample come first: until they have one there is no
+        finite boundary to compare against.
+        """
+        if unsampled := [arm for arm in arms if not arm.samples]:
+            return unsampled[: self.batch_size]
+        ranked = sorted(arms, key=lambda arm: arm.mean)
+        boundary = _boundary(ranked, self.k)
+        if math.isinf(boundary):
+            return ranked[: self.batch_size]
+        overlaps = [
+            (self._radius(arm, len(arms), rounds) - self._margin(arm, boundary), arm)
+            for arm in ranked
+        ]
+        overlaps = [item for item in overlaps if item[0] > 0]
+        overlaps.sort(key=lambda item: item[0], reverse=True)
+        return [arm for _, arm in overlaps[: self.batch_size]]
+
+    def _confidence(self, ranked: list[Arm]) -> float:
+        """Union bound on some arm being more than epsilon / 2 misplaced."""
+        if len(ranked) <= self.k:
+            return 1.0
+        boundary = _boundary(ranked, self.k)
+        if math.isinf(boundary):
+            return 0.0
+        error = 0.0
+        for arm in ranked:
+            if not arm.samples:
+                return 0.0
+            margin = self._margin(arm, boundary)
+            error += math.exp(-arm.samples * margin * margin / (2 * self.sigma**2))
+        return max(0.0, 1.0 - error)
+
+    def _margin(self, arm: Arm, boundary: float) -> float:
+        # Servers within epsilon of each other are interchangeable, so an arm
+        # only counts as misplaced if it is epsilon / 2 past the boundary.
+        return abs(arm.mean - boundary) + self.epsilon / 2
+
+
+@contextlib.contextmanager
+def _measurements_kept(servers: list["Server"]) -> Generator[None, None, None]:
+    """Restore the servers' HTTP measurements after an extra probe round."""
+    saved = [
+        (
+            server.response_time,
+            [dict(getattr(server.response_time, name)) for name in _HTTP_RESULTS],
+            server.response_time.http_lag_flagged,
+        )
+        for server in servers
+    ]
+    try:
+        yield
+    finally:
+        for response_time, results, lag_flagged in saved:
+            for name, result in zip(_HTTP_RESULTS, results, strict=True):
+                getattr(response_time, name).clear()
+                getattr(response_time, name).update(result)
+            response_time.http_lag_flagged = lag_flagged
+
+
+def _boundary(ranked: list[Arm], k: int) -> float:
+    """Midpoint between the k-th and the (k+1)-th mean."""
+    kth, next_ = ranked[k - 1].mean, ranked[k].mean
+    if math.isinf(next_):
+        return kth
+    return (kth + next_) / 2
@@ -0,0 +1,425 @@
+"""Versioned binary server dumps.
+
+Compact layout: ``MAGIC | version (u8) | zlib(columnar JSON)``. Every server
+field, its protocol params and its measurements are stored, so loading a dump
+does not go through ``parse_url`` again. zlib's checksum rejects corrupted
+bodies before they reach the JSON decoder.
+
+The indexed layout (see ``IndexedDump``) trades compression for random access
+by rank or by subscription.
+"""
+
+import contextlib
+import gc
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Generator, Iterable, Sequence
+from dataclasses import fields
+from functools import cached_property
+from pathlib import Path
+
+from src.server.exceptions import DumpFormatError
+from src.server.protocols.vless import VlessParams
+from src.server.protocols.vmess import VmessParams
+from src.server.schema import Responses, Server, ServerParams
+
+DUMP_MAGIC = b"VTSD"
+DUMP_VERSION = 3
+DUMP_SUFFIX = ".vtsd"
+_HEADER = struct.Struct("<4sB")
+
+PARAMS_TYPES: dict[str, type[ServerParams]] = {
+    "vless": VlessParams,
+    "vmess": VmessParams,
+}
+_PARAM_FIELDS = {
+    protocol: [field.name for field in fields(params_type)]
+    for protocol, params_type in PARAMS_TYPES.items()
+}
+_COLUMNS = (
+    "protocol",
+    "address",
+    "port",
+    "username",
+    "raw_url",
+    "subscription",
+    "params",
+    "connection",
+    "tls",
+    "http",
+    "http_estimated",
+    "http_warm",
+    "connection_lag_flagged",
+    "http_lag_flagged",
+)
+# Malformed payloads surface as any of these while rows are unpacked.
+_ROW_ERRORS = (KeyError, IndexError, TypeError, ValueError)
+
+
+def is_binary_dump(header: bytes) -> bool:
+    return header[: len(DUMP_MAGIC)] == DUMP_MAGIC
+
+
+@contextlib.contextmanager
+def gc_paused() -> Generator[None, None, None]:
+    # Building hundreds of thousands of objects otherwise triggers repeated
+    # full collections, which cost more than the (de)serialisation itself.
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _construct(cls: type, names: Sequence[str], values: Sequence) -> object:
+    """Build a frozen slots dataclass without running its ``__init__``.
+
+    Skipping the generated ``__init__`` roughly halves the cost of rebuilding
+    a dump. Defaults and ``__post_init__`` are not applied, so every field has
+    to be passed.
+    """
+    obj = object.__new__(cls)
+    for name, value in zip(names, values, strict=True):
+        object.__setattr__(obj, name, value)
+    return obj
+
+
+_SERVER_FIELDS = [field.name for field in fields(Server)]
+
+
+def dumps_servers(servers: Iterable[Server], compress_level: int = 1) -> bytes:
+    subscriptions: dict[str, int] = {}
+    http_urls: dict[str, int] = {}
+    columns: dict[str, list] = {name: [] for name in _COLUMNS}
+    with gc_paused():
+        for server in servers:
+            columns["protocol"].append(server.protocol)
+            columns["address"].append(server.address)
+            columns["port"].append(server.port)
+            columns["username"].append(server.username)
+            columns["raw_url"].append(server.raw_url)
+            columns["subscription"].append(
+                subscriptions.setdefault(server.from_subscription, len(subscriptions)),
+            )
+            columns["params"].append(server_params_row(server))
+            columns["connection"].append(server.response_time.connection)
+            columns["tls"].append(server.response_time.tls)
+            columns["http"].append(
+                http_row(server.response_time.http, http_urls),
+            )
+            columns["http_estimated"].append(
+                http_row(server.response_time.http_estimated, http_urls),
+            )
+            columns["http_warm"].append(
+                http_row(server.response_time.http_warm, http_urls),
+            )
+            columns["connection_lag_flagged"].append(
+                server.response_time.connection_lag_flagged,
+            )
+            columns["http_lag_flagged"].append(server.response_time.http_lag_flagged)
+        body = json.dumps(
+            {
+                "subscriptions": list(subscriptions),
+                "http_urls": list(http_urls),
+                "param_fields": _PARAM_FIELDS,
+                "columns": columns,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+    return _HEADER.pack(DUMP_MAGIC, DUMP_VERSION) + zlib.compress(
+        body,
+        compress_level,
+    )
+
+
+def loads_servers(data: bytes) -> list[Server]:
+    if len(data) < _HEADER.size or not is_binary_dump(data):
+        msg = "Not a binary server dump"
+        raise DumpFormatError(msg)
+    _, version = _HEADER.unpack_from(data)
+    if version != DUMP_VERSION:
+        msg = f"Unsupported dump version: {version}"
+        raise DumpFormatError(msg)
+
+    with gc_paused():
+        try:
+            payload = json.loads(zlib.decompress(data[_HEADER.size :]))
+        except (zlib.error, ValueError) as e:
+            msg = "Corrupted binary server dump"
+            raise DumpFormatError(msg) from e
+        try:
+            check_param_fields(payload["param_fields"])
+            subscriptions = payload["subscriptions"]
+            http_urls = payload["http_urls"]
+            columns = payload["columns"]
+            return [
+                build_server(row, subscriptions, http_urls)
+                for row in zip(*(columns[name] for name in _COLUMNS), strict=True)
+            ]
+        except _ROW_ERRORS as e:
+            msg = "Malformed binary server dump"
+            raise DumpFormatError(msg) from e
+
+
+def server_params_row(server: Server) -> list:
+    return [getattr(server.params, name) for name in _PARAM_FIELDS[server.protocol]]
+
+
+def http_row(http: dict[str, float], http_urls: dict[str, int]) -> list:
+    return [
+        [http_urls.setdefault(url, len(http_urls)), elapsed]
+        for url, elapsed in http.items()
+    ]
+
+
+def build_server(
+    row: tuple | list,
+    subscriptions: list[str],
+    http_urls: list[str],
+) -> Server:
+    """Rebuild a ``Server`` from a row laid out as ``_COLUMNS``."""
+    (
+        protocol,
+        address,
+        port,
+        username,
+        raw_url,
+        subscription_index,
+        params,
+        connection,
+        tls,
+        http,
+        http_estimated,
+        http_warm,
+        connection_lag_flagged,
+        http_lag_flagged,
+    ) = row
+    values = (
+        protocol,
+        address,
+        port,
+        username,
+        _construct(PARAMS_TYPES[protocol], _PARAM_FIELDS[protocol], params),
+        raw_url,
+        Responses(
+            connection=connection,
+            tls=tls,
+            http={http_urls[url_index]: elapsed for url_index, elapsed in http},
+            http_estimated={
+                http_urls[url_index]: elapsed for url_index, elapsed in http_estimated
+            },
+            http_warm={
+                http_urls[url_index]: elapsed for url_index, elapsed in http_warm
+            },
+            connection_lag_flagged=connection_lag_flagged,
+            http_lag_flagged=http_lag_flagged,
+        ),
+        subscriptions[subscription_index],
+    )
+    return _construct(Server, _SERVER_FIELDS, values)
+
+
+def check_param_fields(param_fields: dict[str, list[str]]) -> None:
+    for protocol, names in param_fields.items():
+        if names != _PARAM_FIELDS.get(protocol):
+            msg = f"Dump params layout for {protocol} does not match this version"
+            raise DumpFormatError(msg)
+
+
+# Indexed dump, readable through mmap without loading the whole file:
+#   header: MAGIC | version (u8) | record count (u32) | meta length (u32)
+#           | index length (u32)
+#   meta:   JSON with the string tables
+#   index:  JSON subscription -> records index, decoded on first use
+#   offsets: (record count + 1) x u64, relative to the start of the records
+#   records: one compact JSON row per server, in rank order
+INDEXED_DUMP_MAGIC = b"VTSI"
+INDEXED_DUMP_VERSION = 2
+INDEXED_DUMP_SUFFIX = ".vtsi"
+_INDEXED_HEADER = struct.Struct("<4sBIII")
+_OFFSET = struct.Struct("<Q")
+# Enough leading bytes to tell the dump formats apart
+DUMP_SNIFF_SIZE = max(len(DUMP_MAGIC), len(INDEXED_DUMP_MAGIC))
+
+
+def is_indexed_dump(header: bytes) -> bool:
+    return header[: len(INDEXED_DUMP_MAGIC)] == INDEXED_DUMP_MAGIC
+
+
+def write_indexed_dump(ranked_servers: Iterable[Server], dump_path: Path) -> None:
+    """Write servers (best first) as an indexed dump."""
+    subscriptions: dict[str, int] = {}
+    http_urls: dict[str, int] = {}
+    by_subscription: dict[int, list[int]] = {}
+    records = []
+    with gc_paused():
+        for num, server in enumerate(ranked_servers):
+            subscription_index = subscriptions.setdefault(
+                server.from_subscription,
+                len(subscriptions),
+            )
+            by_subscription.setdefault(subscription_index, []).append(num)
+            row = [
+                server.protocol,
+                server.address,
+                server.port,
+                server.username,
+                server.raw_url,
+                subscription_index,
+                server_params_row(server),
+                server.response_time.connection,
+                server.response_time.tls,
+                http_row(server.response_time.http, http_urls),
+                http_row(server.response_time.http_estimated, http_urls),
+                http_row(server.response_time.http_warm, http_urls),
+                server.response_time.connection_lag_flagged,
+                server.response_time.http_lag_flagged,
+            ]
+            records.append(json.dumps(row, separators=(",", ":")).encode("utf-8"))
+    meta = json.dumps(
+        {
+            "subscriptions": list(subscriptions),
+            "http_urls": list(http_urls),
+            "param_fields": _PARAM_FIELDS,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    index = json.dumps(
+        list(by_subscription.items()),
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    offsets = bytearray()
+    position = 0
+    for record in records:
+        offsets += _OFFSET.pack(position)
+        position += len(record)
+    offsets += _OFFSET.pack(position)
+    with dump_path.open("wb") as dump_file:
+        dump_file.write(
+            _INDEXED_HEADER.pack(
+                INDEXED_DUMP_MAGIC,
+                INDEXED_DUMP_VERSION,
+                len(records),
+                len(meta),
+                len(index),
+            ),
+        )
+        dump_file.write(meta)
+        dump_file.write(index)
+        dump_file.write(offsets)
+        dump_file.writelines(records)
+
+
+class IndexedDump:
+    """Read-only, memory-mapped view of an indexed dump.
+
+    Only the header and the meta block are decoded on open; the subscription
+    index and server records are decoded on access.
+    """
+
+    def __init__(self, dump_path: str | Path) -> None:
+        self.path = Path(dump_path)
+        with self.path.open("rb") as dump_file:
+            # mmap refuses empty files with ValueError
+            if os.fstat(dump_file.fileno()).st_size < _INDEXED_HEADER.size:
+                msg = f"Not an indexed server dump: {self.path}"
+                raise DumpFormatError(msg)
+            self._mmap = mmap.mmap(dump_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _read_header(self) -> None:
+        if len(self._mmap) < _INDEXED_HEADER.size or not is_indexed_dump(
+            self._mmap[: len(INDEXED_DUMP_MAGIC)],
+        ):
+            msg = f"Not an indexed server dump: {self.path}"
+            raise DumpFormatError(msg)
+        _, version, self._count, meta_length, index_length = (
+            _INDEXED_HEADER.unpack_from(self._mmap)
+        )
+        if version != INDEXED_DUMP_VERSION:
+            msg = f"Unsupported indexed dump version: {version}"
+            raise DumpFormatError(msg)
+        meta_start = _INDEXED_HEADER.size
+        self._index_start = meta_start + meta_length
+        self._offsets_start = self._index_start + index_length
+        self._records_start = self._offsets_start + (self._count + 1) * _OFFSET.size
+        if len(self._mmap) < self._records_start:
+            msg = f"Truncated indexed server dump: {self.path}"
+            raise DumpFormatError(msg)
+        try:
+            meta = json.loads(self._mmap[meta_start : self._index_start])
+            check_param_fields(meta["param_fields"])
+            self._subscriptions: list[str] = meta["subscriptions"]
+            self._http_urls: list[str] = meta["http_urls"]
+        except _ROW_ERRORS as e:
+            msg = f"Corrupted indexed server dump: {self.path}"
+            raise DumpFormatError(msg) from e
+
+    @cached_property
+    def _by_subscription(self) -> dict[str, list[int]]:
+        try:
+            return {
+                self._subscriptions[index]: records
+                for index, records in json.loads(
+                    self._mmap[self._index_start : self._offsets_start],
+                )
+            }
+        except _ROW_ERRORS as e:
+            msg = f"Corrupted indexed server dump: {self.path}"
+            raise DumpFormatError(msg) from e
+
+    def __enter__(self) -> "IndexedDump":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    @property
+    def subscriptions(self) -> list[str]:
+        return list(self._by_subscription)
+
+    def server(self, rank: int) -> Server:
+        if not 0 <= rank < self._count:
+            msg = f"Record {rank} out of range (0..{self._count - 1})"
+            raise IndexError(msg)
+        offset_position = self._offsets_start + rank * _OFFSET.size
+        start = _OFFSET.unpack_from(self._mmap, offset_position)[0]
+        end = _OFFSET.unpack_from(self._mmap, offset_position + _OFFSET.size)[0]
+        try:
+            row = json.loads(
+                self._mmap[self._records_start + start : self._records_start + end],
+            )
+            return build_server(row, self._subscriptions, self._http_urls)
+        except _ROW_ERRORS as e:
+            msg = f"Malformed record {rank} in indexed server dump: {self.path}"
+            raise DumpFormatError(msg) from e
+
+    def top_servers(self, server_amount: int = 0) -> list[Server]:
+        """Return the best ``server_amount`` servers (all if 0)."""
+        if server_amount == 0 or server_amount > self._count:
+            server_amount = self._count
+        with gc_paused():
+            return [self.server(rank) for rank in range(server_amount)]
+
+    def subscription_servers(self, subscription_url: str) -> list[Server]:
+        with gc_paused():
+            return [
+                self.server(rank)
+                for rank in self._by_subscription.get(subscription_url, [])
+            ]
@@ -8,3 +8,7 @@ class UrlParseError(ServerError):
 
 class UnsupportedProtocolError(ServerError):
     pass
+
+
+class DumpFormatError(ServerError):
+    pass
@@ -0,0 +1,319 @@
+"""Probe history across runs, and the prior used to order probe queues.
+
+Every probe outcome updates an exponentially weighted latency and uptime for
+the server and for the subscription it came from. :meth:`ServerHistory.prior`
+turns that into a score (higher is probed first): the server's uptime, shrunk
+towards its subscription's for servers with few probes, times a small bonus
+for servers listed for a long time, divided by the expected latency.
+
+Records of servers and subscriptions not probed for ``HISTORY_EXPIRE_DAYS``
+are dropped when the history is loaded or saved.
+
+Once per run the history also rates each subscription by its yield (expected
+alive servers per published link). Low-yield subscriptions are fetched only
+every ``SUBSCRIPTION_LOW_YIELD_FETCH_EVERY`` runs and their servers probed
+last; the worst are quarantined for ``SUBSCRIPTION_QUARANTINE_DAYS``.
+"""
+
+import json
+import logging
+import statistics
+import time
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from src import metrics
+from src.config import settings
+from src.server.schema import Server
+
+logger = logging.getLogger(__name__)
+
+HISTORY_VERSION = 1
+# Uptime of a subscription nobody probed yet
+DEFAULT_UPTIME = 0.5
+# Pseudo-probes of the subscription uptime mixed into a server's own uptime
+PRIOR_STRENGTH = 2
+MIN_LATENCY = 0.05
+AGE_BONUS = 0.5
+AGE_BONUS_DAYS = 30
+# Prior multiplier for servers of low-yield subscriptions
+LOW_YIELD_PRIORITY = 0.1
+
+
+@dataclass(slots=True)
+class ProbeRecord:
+    # EWMA of successful probe latencies, 0.0 until the first success
+    latency: float = 0.0
+    # EWMA of 1.0 (alive) / 0.0 (dead)
+    uptime: float = DEFAULT_UPTIME
+    probes: int = 0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+
+    def update(self, latency: float | None, now: float, alpha: float) -> None:
+        alive = latency is not None
+        if not self.probes:
+            self.uptime = float(alive)
+            self.first_seen = now
+        else:
+            self.uptime += alpha * (alive - self.uptime)
+        if latency is not None:
+            self.latency = (
+                latency
+                if not self.latency
+                else self.latency + alpha * (latency - self.latency)
+            )
+        self.probes += 1
+        self.last_seen = now
+
+    def to_row(self) -> list:
+        return [self.latency, self.uptime, self.probes, self.first_seen, self.last_seen]
+
+
+@dataclass(slots=True)
+class SubscriptionQuality:
+    links: int = 0
+    # Distinct servers it lists, whichever subscription listed them first
+    unique: int = 0
+    # Listed servers with probe history
+    probed: int = 0
+    # Mean uptime of the probed servers
+    alive_ratio: float = 0.0
+    # Median latency of the servers with a successful probe
+    median_latency: float = 0.0
+    # EWMA over runs of expected alive servers per link
+    yield_ratio: float = 0.0
+    runs: int = 0
+    # Fetches skipped since the last one, for low-yield subscriptions
+    skipped: int = 0
+    quarantined_until: float = 0.0
+
+    def to_row(self) -> list:
+        return [
+            self.links,
+            self.unique,
+            self.probed,
+            self.alive_ratio,
+            self.median_latency,
+            self.yield_ratio,
+            self.runs,
+            self.skipped,
+            self.quarantined_until,
+        ]
+
+    @property
+    def low_yield(self) -> bool:
+        return (
+            self.runs >= settings.SUBSCRIPTION_QUALITY_MIN_RUNS
+            and self.yield_ratio < settings.SUBSCRIPTION_LOW_YIELD_RATIO
+        )
+
+
+class ServerHistory:
+    def __init__(
+        self,
+        path: str | Path = settings.HISTORY_FILE,
+        alpha: float = settings.HISTORY_EWMA_ALPHA,
+        expire_days: float = settings.HISTORY_EXPIRE_DAYS,
+    ) -> None:
+        self.path = Path(path)
+        self.alpha = alpha
+        self.expire_days = expire_days
+        self.servers: dict[str, ProbeRecord] = {}
+        self.subscriptions: dict[str, ProbeRecord] = {}
+        self.quality: dict[str, SubscriptionQuality] = {}
+
+    def observe(self, server: Server, latency: float | None) -> None:
+        """Record one probe outcome; ``latency`` is None for a dead server."""
+        now = time.time()
+        self.servers.setdefault(_key(server), ProbeRecord()).update(
+            latency,
+            now,
+            self.alpha,
+        )
+        self.subscriptions.setdefault(
+            server.from_subscription,
+            ProbeRecord(),
+        ).update(latency, now, self.alpha)
+
+    def observe_many(
+        self,
+        servers: Iterable[Server],
+        latency: float | None = None,
+    ) -> None:
+        for server in servers:
+            self.observe(server, latency)
+
+    def prior(self, server: Server) -> float:
+        subscription = self.subscriptions.get(server.from_subscription)
+        uptime = subscription.uptime if subscription else DEFAULT_UPTIME
+        latency = (
+            subscription.latency
+            if subscription and subscription.latency
+            else settings.PROXYPROBER_TIMEOUT / 2
+        )
+        age_days = 0.0
+        if record := self.servers.get(_key(server)):
+            weight = record.probes / (record.probes + PRIOR_STRENGTH)
+            uptime = weight * record.uptime + (1 - weight) * uptime
+            latency = record.latency or latency
+            age_days = (time.time() - record.first_seen) / 86400
+        age = 1 + AGE_BONUS * min(age_days, AGE_BONUS_DAYS) / AGE_BONUS_DAYS
+        prior = uptime * age / max(latency, MIN_LATENCY)
+        quality = self.quality.get(server.from_subscription)
+        if quality and quality.low_yield:
+            prior *= LOW_YIELD_PRIORITY
+        return prior
+
+    def order(self, servers: Iterable[Server]) -> list[Server]:
+        """Return ``servers`` best prior first."""
+        return sorted(servers, key=self.prior, reverse=True)
+
+    def update_quality(
+        self,
+        url: str,
+        links: int,
+        servers: Sequence[Server],
+    ) -> SubscriptionQuality:
+        """Rate a subscription from the history of every server it lists.
+
+        Servers are attributed to all the subscriptions listing them, so a
+        mirror rates like the subscription it copies.
+        """
+        quality = self.quality.setdefault(url, SubscriptionQuality())
+        records = [
+            record
+            for server in servers
+            if (record := self.servers.get(_key(server))) is not None
+        ]
+        latencies = [record.latency for record in records if record.latency]
+        expected_alive = sum(record.uptime for record in records)
+        run_yield = expected_alive / links if links else 0.0
+        quality.links = links
+        quality.unique = len(servers)
+        quality.probed = len(records)
+        quality.alive_ratio = expected_alive / len(records) if records else 0.0
+        quality.median_latency = statistics.median(latencies) if latencies else 0.0
+        quality.yield_ratio = (
+            run_yield
+            if not quality.runs
+            else quality.yield_ratio + self.alpha * (run_yield - quality.yield_ratio)
+        )
+        quality.runs += 1
+        if (
+            quality.runs >= settings.SUBSCRIPTION_QUALITY_MIN_RUNS
+            and quality.yield_ratio < settings.SUBSCRIPTION_QUARANTINE_RATIO
+        ):
+            quality.quarantined_until = (
+                time.time() + settings.SUBSCRIPTION_QUARANTINE_DAYS * 86400
+            )
+            logger.warning(
+                "Subscription %s quarantined: %.4f alive servers per link.",
+                url,
+                quality.yield_ratio,
+            )
+        return quality
+
+    def should_fetch(self, url: str) -> bool:
+        """Whether to fetch a subscription this run; counts skipped fetches."""
+        quality = self.quality.get(url)
+        if quality is None:
+            return True
+        if quality.quarantined_until > time.time():
+            metrics.SUBSCRIPTIONS_SKIPPED.labels("quarantine").inc()
+            return False
+        if quality.low_yield and (
+            quality.skipped + 1 < settings.SUBSCRIPTION_LOW_YIELD_FETCH_EVERY
+        ):
+            quality.skipped += 1
+            metrics.SUBSCRIPTIONS_SKIPPED.labels("low_yield").inc()
+            return False
+        quality.skipped = 0
+        return True
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Error of read history file: %s", self.path)
+            return
+        if not isinstance(data, dict) or data.get("version") != HISTORY_VERSION:
+            logger.warning("Ignoring history file %s: unknown version.", self.path)
+            return
+        try:
+            servers = {key: ProbeRecord(*row) for key, row in data["servers"].items()}
+            subscriptions = {
+                url: ProbeRecord(*row) for url, row in data["subscriptions"].items()
+            }
+            quality = {
+                url: SubscriptionQuality(*row)
+                for url, row in data.get("quality", {}).items()
+            }
+        except (KeyError, TypeError, AttributeError):
+            # Rows of the wrong length or shape
+            logger.exception("Malformed history file: %s", self.path)
+            return
+        self.servers = servers
+        self.subscriptions = subscriptions
+        self.quality = quality
+        self.expire()
+        logger.info(
+            "History loaded: %d servers, %d subscriptions.",
+            len(self.servers),
+            len(self.subscriptions),
+        )
+
+    def expire(self) -> None:
+        """Drop the records of servers and subscriptions not seen recently."""
+        if not self.expire_days:
+            return
+        now = time.time()
+        cutoff = now - self.expire_days * 86400
+        expired_servers = [
+            key for key, record in self.servers.items() if record.last_seen < cutoff
+        ]
+        for key in expired_servers:
+            del self.servers[key]
+        expired_subscriptions = [
+            url
+            for url, record in self.subscriptions.items()
+            # Quarantined subscriptions are not probed, keep their rating
+            if record.last_seen < cutoff
+            and self.quality.get(url, SubscriptionQuality()).quarantined_until < now
+        ]
+        for url in expired_subscriptions:
+            del self.subscriptions[url]
+            self.quality.pop(url, None)
+        if expired_servers or expired_subscriptions:
+            logger.info(
+                "History expired %d servers, %d subscriptions.",
+                len(expired_servers),
+                len(expired_subscriptions),
+            )
+
+    def save(self) -> None:
+        self.expire()
+        data = {
+            "version": HISTORY_VERSION,
+            "servers": {key: record.to_row() for key, record in self.servers.items()},
+            "subscriptions": {
+                url: record.to_row() for url, record in self.subscriptions.items()
+            },
+            "quality": {
+                url: quality.to_row() for url, quality in self.quality.items()
+            },
+        }
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")))
+            tmp_path.replace(self.path)
+        except OSError:
+            logger.exception("Error of write history file: %s", self.path)
+
+
+def _key(server: Server) -> str:
+    return f"{server.address}:{server.port}"
@@ -14,9 +14,26 @@ PROTOCOLS: dict[str, Callable[[ParseResult, str], Server]] = {
     "vmess": vmess.parse_url,
 }
 
+RAW_URL_KEYS: dict[str, Callable[[str], tuple[str, int] | None]] = {
+    "vless": vless.raw_url_key,
+    "vmess": vmess.raw_url_key,
+}
+
+
+def server_key(url: str) -> tuple[str, int] | None:
+    """Cheap ``(address, port)`` extraction matching ``Server.__hash__``.
+
+    Returns ``None`` when the key cannot be derived without a full parse.
+    """
+    key_getter = RAW_URL_KEYS.get(url.partition(":")[0])
+    return key_getter(url) if key_getter else None
+
 
 def parse_url(url: str, subscription_url: str = "") -> Server:
     logger.debug("Parsing server URL: %s", url)
+    if server := vless.parse_raw_url(url, subscription_url):
+        logger.debug("Successfully parsed server: %s", server)
+        return server
     parsed = urlparse(url)
     try:
         server = PROTOCOLS[parsed.scheme](parsed, subscription_url)
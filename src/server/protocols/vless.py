@@ -7,6 +7,22 @@ from src.server.schema import Server, ServerParams
 
 logger = logging.getLogger(__name__)
 
+_SCHEME_PREFIX = "vless://"
+_NETLOC_DELIMITERS = "/?#"
+_QUERY_UNSAFE_CHARS = frozenset("%+")
+_STR_PARAMS = {
+    "sni": "sni",
+    "pbk": "pbk",
+    "security": "security",
+    "type": "type",
+    "fp": "fp",
+    "path": "path",
+    "serviceName": "service_name",
+    "host": "host",
+    "sid": "sid",
+    "flow": "flow",
+}
+
 
 def parse_url(parsed: ParseResult, subscription_url: str = "") -> Server:
     if not (parsed.scheme and parsed.hostname and parsed.port):
@@ -27,6 +43,68 @@ def parse_url(parsed: ParseResult, subscription_url: str = "") -> Server:
     )
 
 
+def parse_raw_url(url: str, subscription_url: str = "") -> Server | None:
+    """Single-pass parser for plain ``vless://`` links.
+
+    Returns ``None`` for anything it does not handle exactly like the
+    ``urlparse`` based path (IPv6 hosts, percent-encoding, odd ports, ...),
+    so the caller can fall back to :func:`parse_url`.
+    """
+    if url.endswith(("?", "#")) or "?#" in url:
+        return None
+    if not (split := _split_raw_url(url)):
+        return None
+    userinfo, hostname, port, netloc_end = split
+
+    rest, _, _ = url[netloc_end:].partition("#")
+    _, _, query = rest.partition("?")
+    if not _QUERY_UNSAFE_CHARS.isdisjoint(query):
+        return None
+
+    return Server(
+        protocol="vless",
+        address=hostname,
+        port=port,
+        username=userinfo.partition(":")[0],
+        params=_parse_raw_vless_params(query),
+        raw_url=url,
+        from_subscription=subscription_url,
+    )
+
+
+def raw_url_key(url: str) -> tuple[str, int] | None:
+    """Return the ``(address, port)`` a link would parse to, without parsing it."""
+    if not (split := _split_raw_url(url)):
+        return None
+    _, hostname, port, _ = split
+    return hostname, port
+
+
+def _split_raw_url(url: str) -> tuple[str, str, int, int] | None:
+    if not url.startswith(_SCHEME_PREFIX) or not url.isascii() or " " in url:
+        return None
+    if not url.isprintable():
+        return None
+
+    netloc_end = len(url)
+    for delimiter in _NETLOC_DELIMITERS:
+        pos = url.find(delimiter, len(_SCHEME_PREFIX))
+        if pos != -1 and pos < netloc_end:
+            netloc_end = pos
+    netloc = url[len(_SCHEME_PREFIX) : netloc_end]
+    if "[" in netloc or "]" in netloc:
+        return None
+
+    userinfo, _, hostinfo = netloc.rpartition("@")
+    hostname, _, port_str = hostinfo.partition(":")
+    if not (hostname and port_str.isdigit()):
+        return None
+    port = int(port_str)
+    if not 0 < port <= 65535:  # noqa: PLR2004
+        return None
+    return userinfo, hostname.lower(), port, netloc_end
+
+
 @dataclass(frozen=True, slots=True)
 class VlessParams(ServerParams):
     sni: str = ""
@@ -62,3 +140,30 @@ def _parse_vless_params(raw_params: str) -> VlessParams:
         sid=get_param("sid"),
         flow=get_param("flow"),
     )
+
+
+def _parse_raw_vless_params(query: str) -> VlessParams:
+    params: dict[str, str] = {}
+    alpn: list[str] = []
+    for pair in query.split("&"):
+        key, sep, value = pair.partition("=")
+        if not (sep and value):
+            continue
+        if key == "alpn":
+            alpn.append(value)
+        elif (field_name := _STR_PARAMS.get(key)) and field_name not in params:
+            params[field_name] = value
+
+    return VlessParams(
+        sni=params.get("sni", ""),
+        pbk=params.get("pbk", ""),
+        security=params.get("security", "none"),
+        type=params.get("type", "tcp"),
+        fp=params.get("fp", ""),
+        path=params.get("path", "/"),
+        service_name=params.get("service_name", ""),
+        host=params.get("host", ""),
+        alpn=alpn or None,
+        sid=params.get("sid", ""),
+        flow=params.get("flow", ""),
+    )
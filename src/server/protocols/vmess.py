@@ -8,6 +8,9 @@ from src.server.schema import Server, ServerParams
 
 logger = logging.getLogger(__name__)
 
+_SCHEME_PREFIX = "vmess://"
+_NETLOC_DELIMITERS = "/?#"
+
 
 def parse_url(parsed: ParseResult, subscription_url: str = "") -> Server:
     raw_params = json.loads(decode_base64(parsed.netloc))
@@ -27,6 +30,25 @@ def parse_url(parsed: ParseResult, subscription_url: str = "") -> Server:
     )
 
 
+def raw_url_key(url: str) -> tuple[str, int] | None:
+    """Return the ``(address, port)`` a link would parse to, without parsing it."""
+    if not url.startswith(_SCHEME_PREFIX) or not url.isascii():
+        return None
+    netloc_end = len(url)
+    for delimiter in _NETLOC_DELIMITERS:
+        pos = url.find(delimiter, len(_SCHEME_PREFIX))
+        if pos != -1 and pos < netloc_end:
+            netloc_end = pos
+    try:
+        raw_params = json.loads(decode_base64(url[len(_SCHEME_PREFIX) : netloc_end]))
+        address, port = raw_params["add"], raw_params["port"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not (isinstance(address, str) and isinstance(port, int | str)):
+        return None
+    return address, port
+
+
 @dataclass(frozen=True, slots=True)
 class VmessParams(ServerParams):
     add: str
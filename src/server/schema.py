@@ -4,7 +4,30 @@ from dataclasses import dataclass, field
 @dataclass
 class Responses:
     connection: float = 999.0
+    # TLS handshake time, stays 0.0 for servers without TLS
+    tls: float = 0.0
     http: dict[str, float] = field(default_factory=dict)
+    # Estimates for the URLs the HTTP cutoff skipped, never measured
+    http_estimated: dict[str, float] = field(default_factory=dict)
+    # Mean latency of the warm requests per URL, see HTTP_PROBER_WARM_REQUESTS
+    http_warm: dict[str, float] = field(default_factory=dict)
+    # Set when the stage's sample was taken while the event loop lagged
+    connection_lag_flagged: bool = False
+    http_lag_flagged: bool = False
+
+    @property
+    def http_total(self) -> float:
+        """Ranking total: measured HTTP latencies plus the cutoff estimates."""
+        return sum(self.http.values()) + sum(self.http_estimated.values())
+
+    def reset(self) -> None:
+        self.connection = 999.0
+        self.tls = 0.0
+        self.http.clear()
+        self.http_estimated.clear()
+        self.http_warm.clear()
+        self.connection_lag_flagged = False
+        self.http_lag_flagged = False
 
 
 @dataclass(frozen=True, slots=True)
@@ -1,5 +1,6 @@
 import json
 import logging
+import os
 from collections import defaultdict
 from collections.abc import Iterable, Iterator
 from datetime import datetime
@@ -7,10 +8,24 @@ from itertools import islice
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from src import metrics, tracing
 from src.config import settings
-from src.prober import ConnectionProber, HttpProber
-from src.server.exceptions import ServerError
-from src.server.parser import parse_url
+from src.prober import CONNECTION_PROBERS, HTTP_PROBERS, TlsProber
+from src.ranking import BanditRanker, TopK
+from src.server.dump import (
+    DUMP_SNIFF_SIZE,
+    DUMP_SUFFIX,
+    INDEXED_DUMP_SUFFIX,
+    IndexedDump,
+    dumps_servers,
+    is_binary_dump,
+    is_indexed_dump,
+    loads_servers,
+    write_indexed_dump,
+)
+from src.server.exceptions import DumpFormatError, ServerError
+from src.server.history import ServerHistory
+from src.server.parser import parse_url, server_key
 from src.server.schema import Server
 
 if TYPE_CHECKING:
@@ -20,12 +35,31 @@ logger = logging.getLogger(__name__)
 
 
 class ServerManager:
-    def __init__(self):
+    def __init__(self, history: ServerHistory | None = None) -> None:
+        """``history`` is used as given; by default ``HISTORY_FILE`` is loaded."""
         self.servers: set[Server] = set()
-        self.connection_prober = ConnectionProber()
-        self.http_prober = HttpProber()
+        # (address, port) -> server for every server in self.servers, so
+        # duplicate links can be resolved before parsing
+        self._server_keys: dict[tuple[str, int], Server] = {}
+        # Every server each subscription lists (duplicates of other
+        # subscriptions included) and its link count, for the subscription
+        # quality index
+        self.subscription_servers: defaultdict[str, list[Server]] = defaultdict(list)
+        self.subscription_links: dict[str, int] = {}
+        self.connection_prober = CONNECTION_PROBERS[
+            settings.CONNECTION_PROBER_ENGINE
+        ]()
+        self.tls_prober = TlsProber()
+        self.http_prober = HTTP_PROBERS[settings.HTTP_PROBER_ENGINE]()
+        self.ranker = BanditRanker(self.http_prober)
+        if history is None:
+            history = ServerHistory()
+            if settings.HISTORY_ENABLED:
+                history.load()
+        self.history = history
         logger.debug("ServerManager initialized.")
 
+    @tracing.traced()
     def add_from_subscription(
         self,
         subscription: "Subscription",
@@ -38,22 +72,49 @@ class ServerManager:
             only_443_port,
         )
         initial_server_count = len(self.servers)
+        skipped_count = 0
+        listed: list[Server] = []
         for server_url in subscription.servers:
+            if (known := self._server_keys.get(server_key(server_url))) is not None:
+                skipped_count += 1
+                listed.append(known)
+                continue
             try:
                 server = parse_url(server_url, subscription.url)
             except ServerError:  # noqa: PERF203
+                protocol = server_url.partition("://")[0]
+                metrics.LINK_PARSE_ERRORS.labels(protocol).inc()
                 continue
             else:
+                metrics.LINKS_PARSED.labels(server.protocol).inc()
                 if (only_443_port and server.port != 443) or (  # noqa: PLR2004
                     not only_443_port and server
                 ):
+                    server = self._server_keys.setdefault(
+                        (server.address, server.port),
+                        server,
+                    )
                     self.servers.add(server)
+                    listed.append(server)
 
+        self.subscription_servers[subscription.url] = list(dict.fromkeys(listed))
+        self.subscription_links[subscription.url] = len(subscription.servers)
+        metrics.DUPLICATE_LINKS.inc(skipped_count)
         added_count = len(self.servers) - initial_server_count
+        tracing.current_span().set_attributes(
+            {
+                "url": subscription.url,
+                "links": len(subscription.servers),
+                "servers.added": added_count,
+                "links.duplicate": skipped_count,
+            },
+        )
         logger.info(
-            "Added %d new servers from subscription %s. Total servers: %d",
+            "Added %d new servers from subscription %s "
+            "(%d duplicate links skipped). Total servers: %d",
             added_count,
             subscription.url,
+            skipped_count,
             len(self.servers),
         )
 
@@ -61,21 +122,146 @@ class ServerManager:
         for subscription in subscriptions:
             self.add_from_subscription(subscription)
 
-    async def filter_alive_connection_servers(self) -> None:
-        await self.connection_prober.probe(self.servers)
-        self.servers = {
+    def drop_unlisted(
+        self,
+        subscriptions: Iterable["Subscription"],
+        kept_subscription_urls: set[str],
+    ) -> set[Server]:
+        """Drop servers none of ``subscriptions`` lists any more.
+
+        Servers from ``kept_subscription_urls`` (subscriptions not fetched this
+        time) stay. Returns the dropped servers.
+        """
+        links = {
+            link for subscription in subscriptions for link in subscription.servers
+        }
+        keys = {server_key(link) for link in links}
+        dropped = {
             server
             for server in self.servers
-            if server.response_time.connection < settings.DONT_ALIVE_CONNECTION_TIME
+            if server.raw_url not in links
+            and (server.address, server.port) not in keys
+            and server.from_subscription not in kept_subscription_urls
         }
+        if dropped:
+            self.servers -= dropped
+            self._reset_server_keys()
+            for url, servers in self.subscription_servers.items():
+                self.subscription_servers[url] = [
+                    server for server in servers if server not in dropped
+                ]
+        return dropped
+
+    def subscriptions_to_fetch(
+        self,
+        subscriptions: Iterable["Subscription"],
+    ) -> list["Subscription"]:
+        """Drop quarantined and off-turn low-yield subscriptions."""
+        if not settings.HISTORY_ENABLED:
+            return list(subscriptions)
+        subscriptions = list(subscriptions)
+        to_fetch = [
+            subscription
+            for subscription in subscriptions
+            if self.history.should_fetch(subscription.url)
+        ]
+        if skipped := len(subscriptions) - len(to_fetch):
+            logger.info("Skipping %d low-yield or quarantined subscriptions.", skipped)
+        return to_fetch
+
+    def update_subscription_quality(self) -> None:
+        """Rate the subscriptions ingested this run; call after probing."""
+        if not settings.HISTORY_ENABLED:
+            return
+        low_yield = rated = 0
+        for url, links in self.subscription_links.items():
+            if not links:
+                # Failed fetch: nothing to rate
+                continue
+            rated += 1
+            quality = self.history.update_quality(
+                url,
+                links,
+                self.subscription_servers.get(url, []),
+            )
+            low_yield += quality.low_yield
+        logger.info(
+            "Subscription quality updated: %d of %d low-yield.",
+            low_yield,
+            rated,
+        )
 
+    @tracing.traced()
+    async def filter_alive_connection_servers(self) -> None:
+        await self.connection_prober.probe(self.probe_order())
+        self._drop_dead(
+            {
+                server
+                for server in self.servers
+                if server.response_time.connection
+                < settings.DONT_ALIVE_CONNECTION_TIME
+            },
+        )
+
+    @tracing.traced()
+    async def filter_alive_tls_servers(self) -> None:
+        await self.tls_prober.probe(self.probe_order())
+        self._drop_dead(
+            {
+                server
+                for server in self.servers
+                if server.response_time.tls < settings.DONT_ALIVE_CONNECTION_TIME
+            },
+        )
+
+    @tracing.traced()
     async def filter_alive_http_servers(self) -> None:
-        await self.http_prober.probe(self.servers)
-        self.servers = {
-            server
-            for server in self.servers
-            if sum(server.response_time.http.values())
-            < settings.DONT_ALIVE_CONNECTION_TIME
+        await self.http_prober.probe(
+            self.probe_order(),
+            stop_after=settings.HTTP_PROBER_EARLY_EXIT_TOP_K,
+        )
+        alive = set()
+        for server in self.servers:
+            http = server.response_time.http
+            # Servers skipped by the early exit are dropped unprobed
+            if http and sum(http.values()) < settings.DONT_ALIVE_CONNECTION_TIME:
+                alive.add(server)
+                if settings.HISTORY_ENABLED:
+                    self.history.observe(server, sum(http.values()) / len(http))
+        self._drop_dead(
+            alive,
+            probed={server for server in self.servers if server.response_time.http},
+        )
+
+    def probe_order(self) -> list[Server]:
+        """Servers to probe, most promising (by history) first."""
+        if settings.HISTORY_ENABLED:
+            return self.history.order(self.servers)
+        return list(self.servers)
+
+    def save_history(self) -> None:
+        if settings.HISTORY_ENABLED:
+            self.history.save()
+
+    def _drop_dead(
+        self,
+        alive: set[Server],
+        probed: set[Server] | None = None,
+    ) -> None:
+        if settings.HISTORY_ENABLED:
+            self.history.observe_many(
+                (self.servers if probed is None else probed) - alive,
+            )
+        self.servers = alive
+        self._reset_server_keys()
+
+    async def rank_top_servers(self) -> TopK:
+        """Spend ``BANDIT_PROBE_BUDGET`` extra HTTP probes on the top-k."""
+        return await self.ranker.rank(self.servers)
+
+    def _reset_server_keys(self) -> None:
+        self._server_keys = {
+            (server.address, server.port): server for server in self.servers
         }
 
     def fastest_connention_time_servers(
@@ -101,7 +287,7 @@ class ServerManager:
         )
         sorted_servers = sorted(
             self.servers,
-            key=lambda s: sum(s.response_time.http.values()),
+            key=lambda s: s.response_time.http_total,
         )
         if server_amount == 0:
             return iter(sorted_servers)
@@ -136,25 +322,63 @@ class ServerExporter:
             subscription_filename = "subscription.txt"
         if isinstance(subscription_filename, str):
             subscription_filename = Path(subscription_filename)
-        subscription_filename.write_text(self.generate_subscription(servers))
+        # Write next to the target and swap it in, so readers never see a
+        # partially written subscription.
+        tmp_filename = subscription_filename.with_name(
+            f".{subscription_filename.name}.tmp",
+        )
+        tmp_filename.write_text(self.generate_subscription(servers))
+        tmp_filename.replace(subscription_filename)
         logger.info("Subscription file %s successfully created.", subscription_filename)
 
 
 class ServerDumper:
-    def _generate_dump_filename(self) -> Path:
+    """Writes and reads server dumps.
+
+    The default format is the compact binary one from ``src.server.dump``.
+    A ``.vtsi`` filename writes the indexed (mmap-friendly, ranked) format and
+    a ``.json`` filename the legacy subscription -> raw URLs map.
+    """
+
+    def _generate_dump_filename(self, suffix: str = DUMP_SUFFIX) -> Path:
         now = datetime.now()  # noqa: DTZ005
         seconds_of_day = now.hour * 3600 + now.minute * 60 + now.second
-        return Path(f"{now.day}.{now.month}.{now.year}_{seconds_of_day}.json")
+        return Path(f"{now.day}.{now.month}.{now.year}_{seconds_of_day}{suffix}")
 
+    @tracing.traced()
     def write_servers_dump(
         self,
-        servers: set[Server],
+        servers: Iterable[Server],
         dump_filename: str | Path | None = None,
     ) -> None:
         if dump_filename is None:
             dump_filename = self._generate_dump_filename()
         elif isinstance(dump_filename, str):
             dump_filename = Path(dump_filename)
+        tracing.current_span().set_attribute("path", str(dump_filename))
+        if dump_filename.suffix == ".json":
+            self._write_json_dump(servers, dump_filename)
+            return
+        try:
+            if dump_filename.suffix == INDEXED_DUMP_SUFFIX:
+                write_indexed_dump(
+                    sorted(servers, key=self._rank_key),
+                    settings.DUMPS_DIR / dump_filename,
+                )
+            else:
+                (settings.DUMPS_DIR / dump_filename).write_bytes(
+                    dumps_servers(servers),
+                )
+        except OSError:
+            logger.exception("Error of write dump file: %s", str(dump_filename))
+        else:
+            tracing.current_span().set_attribute(
+                "bytes",
+                (settings.DUMPS_DIR / dump_filename).stat().st_size,
+            )
+            logger.info("Dump file %s successfully created.", str(dump_filename))
+
+    def _write_json_dump(self, servers: Iterable[Server], dump_filename: Path) -> None:
         dump_data = defaultdict(list)
         for server in servers:
             dump_data[server.from_subscription].append(server.raw_url)
@@ -166,20 +390,81 @@ class ServerDumper:
         else:
             logger.info("Dump file %s successfully created.", str(dump_filename))
 
+    @tracing.traced()
     def read_servers_dump(
         self,
         dump_filename: str | Path,
         servers: set[Server],
     ) -> None:
         try:
-            with Path(dump_filename).open("r") as dump_file:
-                dump_data = json.load(dump_file)
-        except OSError:
+            with Path(dump_filename).open("rb") as dump_file:
+                header = dump_file.read(DUMP_SNIFF_SIZE)
+                dump_size = os.fstat(dump_file.fileno()).st_size
+                if is_indexed_dump(header):
+                    with IndexedDump(dump_filename) as dump:
+                        servers.update(dump.top_servers())
+                elif is_binary_dump(header):
+                    servers.update(loads_servers(header + dump_file.read()))
+                else:
+                    self._add_from_json_dump(
+                        json.loads(header + dump_file.read()),
+                        servers,
+                    )
+        except (OSError, ValueError, DumpFormatError):
+            # ValueError: malformed legacy JSON dump
             logger.exception("Error of read dump file: %s", dump_filename)
         else:
-            for subscription_url, server_urls in dump_data.items():
-                for server_url in server_urls:
-                    servers.add(
-                        parse_url(server_url, subscription_url),
-                    )
-            logger.info("Dump file %s successfully loaded.", dump_file)
+            tracing.current_span().set_attributes(
+                {
+                    "path": str(dump_filename),
+                    "bytes": dump_size,
+                    "servers": len(servers),
+                },
+            )
+            logger.info("Dump file %s successfully loaded.", dump_filename)
+
+    def _add_from_json_dump(
+        self,
+        dump_data: dict[str, list[str]],
+        servers: set[Server],
+    ) -> None:
+        for subscription_url, server_urls in dump_data.items():
+            for server_url in server_urls:
+                servers.add(
+                    parse_url(server_url, subscription_url),
+                )
+
+    def read_top_servers(
+        self,
+        dump_filename: str | Path,
+        server_amount: int = 0,
+    ) -> list[Server]:
+        """Read the best ``server_amount`` servers (all if 0) of an indexed dump."""
+        try:
+            with IndexedDump(dump_filename) as dump:
+                return dump.top_servers(server_amount)
+        except (OSError, DumpFormatError):
+            logger.exception("Error of read dump file: %s", dump_filename)
+            return []
+
+    def read_subscription_servers(
+        self,
+        dump_filename: str | Path,
+        subscription_url: str,
+    ) -> list[Server]:
+        """Read the servers of one subscription from an indexed dump."""
+        try:
+            with IndexedDump(dump_filename) as dump:
+                return dump.subscription_servers(subscription_url)
+        except (OSError, DumpFormatError):
+            logger.exception("Error of read dump file: %s", dump_filename)
+            return []
+
+    @staticmethod
+    def _rank_key(server: Server) -> tuple[float, float]:
+        http_time = (
+            server.response_time.http_total
+            if server.response_time.http
+            else settings.DONT_ALIVE_CONNECTION_TIME
+        )
+        return http_time, server.response_time.connection
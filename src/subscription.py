@@ -2,10 +2,12 @@ import asyncio
 import base64
 import binascii
 import logging
+from collections.abc import Iterable
 from pathlib import Path
 
 import httpx
 from server.parser import PROTOCOLS
+from src import metrics, tracing
 from src.models import Subscription
 
 logger = logging.getLogger(__name__)
@@ -46,16 +48,29 @@ class SubscriptionManager:
             self.subscriptions |= {Subscription(url=url) for url in subscriptions}
             logger.debug("Total subscriptions now: %d", len(self.subscriptions))
 
+    @tracing.traced()
     async def fetch_subscriptions_content(
         self,
         timeout: int = 5,
         concurent_connections: int = 50,
+        subscriptions: Iterable[Subscription] | None = None,
     ) -> None:
+        """Fetch ``subscriptions`` (all known ones by default)."""
+        if subscriptions is None:
+            subscriptions = self.subscriptions
+        subscriptions = list(subscriptions)
         logger.info(
             "Fetching content for %d subscriptions with concurrency=%d",
-            len(self.subscriptions),
+            len(subscriptions),
             concurent_connections,
         )
+        span = tracing.current_span()
+        span.set_attributes(
+            {
+                "subscriptions": len(subscriptions),
+                "concurrency": concurent_connections,
+            },
+        )
         semaphore = asyncio.Semaphore(concurent_connections)
         async with httpx.AsyncClient() as client:
             tasks = [
@@ -65,7 +80,7 @@ class SubscriptionManager:
                     semaphore,
                     timeout=timeout,
                 )
-                for subscription in self.subscriptions
+                for subscription in subscriptions
             ]
             subscription_contents = await asyncio.gather(
                 *tasks,
@@ -87,9 +102,11 @@ class SubscriptionManager:
         logger.info(
             "Finished fetching subscriptions. Successfully processed %d out of %d.",
             successful_fetches,
-            len(self.subscriptions),
+            len(subscriptions),
         )
+        span.set_attribute("subscriptions.fetched", successful_fetches)
 
+    @tracing.traced()
     async def _fetch_subscription_url(
         self,
         subscription: Subscription,
@@ -97,6 +114,8 @@ class SubscriptionManager:
         semaphore: asyncio.Semaphore,
         timeout: int = 5,
     ) -> tuple[Subscription, str]:
+        span = tracing.current_span()
+        span.set_attribute("url", subscription.url)
         async with semaphore:
             logger.debug("Fetching subscription from %s", subscription.url)
             try:
@@ -104,14 +123,23 @@ class SubscriptionManager:
                 response.raise_for_status()
             except (httpx.RequestError, httpx.HTTPStatusError):
                 logger.warning("Failed to fetch subscription from %s", subscription.url)
+                metrics.SUBSCRIPTIONS_FETCHED.labels("error").inc()
                 return subscription, ""
             except Exception:
                 logger.exception(
                     "An unexpected error occurred while fetching subscription from %s",
                     subscription.url,
                 )
+                metrics.SUBSCRIPTIONS_FETCHED.labels("error").inc()
                 return subscription, ""
             else:
+                metrics.SUBSCRIPTIONS_FETCHED.labels("ok").inc()
+                span.set_attributes(
+                    {
+                        "http.status_code": response.status_code,
+                        "response.bytes": len(response.content),
+                    },
+                )
                 logger.debug(
                     "Successfully fetched content from %s",
                     subscription.url,
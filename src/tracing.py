@@ -0,0 +1,217 @@
+"""Optional tracing spans written as OTLP/JSON lines.
+
+Spans nest through a context variable, so they follow asyncio tasks. Each
+line of ``TRACE_FILE`` is an OTLP ``ExportTraceServiceRequest`` in its JSON
+encoding: the OpenTelemetry collector reads the file with its
+``otlpjsonfile`` receiver and forwards it to Jaeger, Tempo, etc. With
+``TRACING_ENABLED`` unset, :func:`span` and :func:`current_span` return a
+shared no-op span.
+"""
+
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "vpn-topservers"
+SPAN_KIND_INTERNAL = 1
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = (
+        "attributes",
+        "end_ns",
+        "name",
+        "parent_id",
+        "span_id",
+        "start_ns",
+        "status",
+        "status_message",
+        "trace_id",
+    )
+
+    def __init__(self, name: str, parent: "Span | None") -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else ""
+        self.attributes: dict[str, Any] = {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:  # noqa: ANN401
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def to_otlp(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:  # noqa: ANN401
+        pass
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonLinesExporter:
+    """Buffers finished spans and appends them to ``path`` in batches."""
+
+    def __init__(self, path: str | Path, batch_size: int = 512) -> None:
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+        # A finished root span closes a trace, flush it right away
+        if len(self._spans) >= self.batch_size or not span.parent_id:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._spans:
+            return
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": SERVICE_NAME},
+                        ),
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in self._spans],
+                        },
+                    ],
+                },
+            ],
+        }
+        self._spans.clear()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(json.dumps(request, separators=(",", ":")) + "\n")
+        except OSError:
+            logger.exception("Failed to write spans to %s", self.path)
+
+
+class Tracer:
+    def __init__(self, exporter: JsonLinesExporter | None = None) -> None:
+        self.exporter = exporter
+        self._current: ContextVar[Span | None] = ContextVar(
+            "current_span",
+            default=None,
+        )
+
+    @contextlib.contextmanager
+    def span(
+        self,
+        name: str,
+        attributes: dict[str, Any] | None = None,
+    ) -> Iterator[Span | _NoopSpan]:
+        if self.exporter is None:
+            yield NOOP_SPAN
+            return
+        span = Span(name, self._current.get())
+        if attributes:
+            span.attributes.update(attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = STATUS_ERROR
+            span.status_message = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            self.exporter.export(span)
+
+    def current_span(self) -> Span | _NoopSpan:
+        return self._current.get() or NOOP_SPAN
+
+    def flush(self) -> None:
+        if self.exporter:
+            self.exporter.flush()
+
+
+def traced[F: Callable[..., Any]](name: str | None = None) -> Callable[[F], F]:
+    """Run every call of the decorated (async) function in a span."""
+
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:  # noqa: ANN401
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+tracer = Tracer(
+    JsonLinesExporter(settings.TRACE_FILE) if settings.TRACING_ENABLED else None,
+)
+span = tracer.span
+current_span = tracer.current_span
+atexit.register(tracer.flush)
@@ -1,5 +1,7 @@
 import logging
-from typing import TYPE_CHECKING
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
 
 from grpc import Channel, insecure_channel
 from src.xray.helpers import to_typed_message
@@ -11,6 +13,7 @@ if TYPE_CHECKING:
     from src.server.server import Server
 
 
+from src import metrics
 from src.config import settings
 from src.xray.stubs.app.proxyman.command.command_pb2 import (
     AddInboundRequest,
@@ -49,7 +52,11 @@ class XrayApi:
             msg = f"Unsupported protocol: {server.protocol}"
             raise ValueError(msg)  # noqa: B904
         else:
-            self._handler_stub.AddOutbound(AddOutboundRequest(outbound=handler_config))
+            self._call(
+                "AddOutbound",
+                self._handler_stub.AddOutbound,
+                AddOutboundRequest(outbound=handler_config),
+            )
             logger.debug("Added outbound %s (%s)", tag, server.protocol)
 
     def add_inbound(
@@ -59,7 +66,11 @@ class XrayApi:
         tag: str = "inbound",
     ) -> None:
         handler_config = protocol.add(port, tag)
-        self._handler_stub.AddInbound(AddInboundRequest(inbound=handler_config))
+        self._call(
+            "AddInbound",
+            self._handler_stub.AddInbound,
+            AddInboundRequest(inbound=handler_config),
+        )
         logger.debug("Added inbound %s (%s)", tag, protocol.name)
 
     def add_routing_rule(
@@ -80,16 +91,38 @@ class XrayApi:
                 ),
             ],
         )
-        self._route_stub.AddRule(
+        self._call(
+            "AddRule",
+            self._route_stub.AddRule,
             AddRuleRequest(shouldAppend=True, config=to_typed_message(cfg)),
         )
         logger.debug("Added rule %s", rt)
 
     def remove_outbound(self, tag: str) -> None:
-        self._handler_stub.RemoveOutbound(RemoveOutboundRequest(tag=tag))
+        self._call(
+            "RemoveOutbound",
+            self._handler_stub.RemoveOutbound,
+            RemoveOutboundRequest(tag=tag),
+        )
         logger.debug("Removed outbound %s", tag)
 
     def remove_routing_rule(self, rule_tag: str) -> None:
-        self._route_stub.RemoveRule(
+        self._call(
+            "RemoveRule",
+            self._route_stub.RemoveRule,
             RemoveRuleRequest(ruleTag=rule_tag),
         )
+
+    def _call(
+        self,
+        method: str,
+        rpc: Callable[[Any], Any],
+        request: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        start = time.perf_counter()
+        try:
+            return rpc(request)
+        finally:
+            metrics.XRAY_RPC_LATENCY.labels(method).observe(
+                time.perf_counter() - start,
+            )
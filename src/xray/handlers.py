@@ -6,6 +6,7 @@ from time import sleep
 from typing import TYPE_CHECKING, Any
 
 import psutil
+from src import tracing
 from src.config import settings
 from src.xray.api import XrayApi
 from xray.protocols import InboundProtocol
@@ -114,13 +115,21 @@ class XrayPoolHandler:
         self,
         servers: Sequence["Server"],
     ) -> Generator[None, Any, None]:
+        outbound_tags = self._setup_outbound_pool(servers)
+        yield
+        self._teardown_outbound_pool(outbound_tags)
+
+    @tracing.traced("outbound_pool.setup")
+    def _setup_outbound_pool(self, servers: Sequence["Server"]) -> list[str]:
         if self.process_manager.is_running():
             self.api.create_handler_stubs()
         else:
             logger.debug("Xray not running. Starting...")
             self.process_manager.run()
             self.api.create_handler_stubs()
-            self.add_inbound_pool(pool_size=len(servers))
+            # Inbounds live as long as the xray process, so size them for the
+            # largest chunk rather than the first one.
+            self.add_inbound_pool()
         logger.debug("Add inbound pool")
         outbound_tags = []
         for num, server in enumerate(servers):
@@ -139,7 +148,14 @@ class XrayPoolHandler:
                     server.raw_url,
                     e,
                 )
-        yield
+        tracing.current_span().set_attributes(
+            {"servers": len(servers), "outbounds.added": len(outbound_tags)},
+        )
+        return outbound_tags
+
+    @tracing.traced("outbound_pool.teardown")
+    def _teardown_outbound_pool(self, outbound_tags: list[str]) -> None:
+        tracing.current_span().set_attribute("outbounds", len(outbound_tags))
         # TODO: Add except error and restart xray
         logger.debug("Wait 0.5 sec before removing outbound")
         sleep(0.5)